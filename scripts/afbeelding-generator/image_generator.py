@@ -5,28 +5,39 @@ Generates clickbait thumbnails for articles using OpenAI's image generation API.
 """
 
 import os
-import re
 import base64
+import importlib.util
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from openai import OpenAI
-from supabase import create_client, Client
 from dotenv import load_dotenv
 
+# Shared instrumentation and clients (scripts/pipeline_metrics.py, scripts/pipeline_clients.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import pipeline_metrics as metrics  # noqa: E402
+from pipeline_clients import RateLimiter, get_openai_client, get_supabase, has_rows  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize clients
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
 # Image output directory
 SCRIPT_DIR = Path(__file__).parent
 IMAGES_DIR = SCRIPT_DIR / "afbeeldingen"
 
+# Batch mode: articles per batch, images generated at the same time and total time budget (seconds)
+BATCH_SIZE = int(os.getenv("IMAGE_BATCH_SIZE", "5"))
+MAX_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "3"))
+TIME_BUDGET_SECONDS = float(os.getenv("IMAGE_TIME_BUDGET", "600"))
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("IMAGE_RATE_LIMIT_RETRIES", "5"))
+
+# Inline pipeline: create and upload the WebP variants in this process straight from
+# the generated bytes. The PNG is only written to IMAGES_DIR if that fails, so the
+# image processor can pick it up later.
+INLINE_PIPELINE = os.getenv("IMAGE_PIPELINE_INLINE", "1") == "1"
+IMAGE_PROCESSOR_PATH = SCRIPT_DIR.parent / "afbeelding-processor" / "image_processor.py"
+
 
 def ensure_images_directory():
     """Create the images directory if it doesn't exist."""
@@ -34,32 +45,20 @@ def ensure_images_directory():
     print(f"Images directory: {IMAGES_DIR}")
 
 
-def slugify(text: str) -> str:
-    """Convert text to a URL/filename-safe slug."""
-    # Convert to lowercase
-    slug = text.lower()
-    # Replace spaces with hyphens
-    slug = slug.replace(" ", "-")
-    # Remove special characters (keep only alphanumeric and hyphens)
-    slug = re.sub(r"[^a-z0-9\-]", "", slug)
-    # Remove multiple consecutive hyphens
-    slug = re.sub(r"-+", "-", slug)
-    # Remove leading/trailing hyphens
-    slug = slug.strip("-")
-    # Limit length
-    slug = slug[:50]
-    return slug
+def get_articles_without_image(limit: int, after_id: str = "") -> list:
+    """Fetch up to `limit` articles without an image, in id order after `after_id`."""
+    query = get_supabase().table("articles").select("id, title, summary").is_("image_standard", "null")
+    if after_id:
+        query = query.gt("id", after_id)
+    response = query.order("id").limit(limit).execute()
+    return response.data or []
 
 
-def get_article_without_image():
-    """Fetch one article that doesn't have an image yet."""
-    response = supabase.table("articles").select("id, title, summary").is_("image_standard", "null").limit(1).execute()
-
-    if response.data and len(response.data) > 0:
-        return response.data[0]
-    return None
+# Shared pause after a 429, so every worker waits instead of hammering the API
+call_with_rate_limit = RateLimiter(MAX_RATE_LIMIT_RETRIES).call
 
 
+@metrics.timed()
 def generate_thumbnail(title: str, summary: str) -> str:
     """Generate a thumbnail image using OpenAI's image generation API."""
     # Format summary if it's a list
@@ -72,7 +71,8 @@ def generate_thumbnail(title: str, summary: str) -> str:
 
     print(f"  Generating image with prompt: {prompt[:100]}...")
 
-    response = openai_client.images.generate(
+    response = call_with_rate_limit(
+        get_openai_client().images.generate,
         model="gpt-image-1",
         prompt=prompt,
         size="1792x1024",  # Landscape 16:9 formaat
@@ -86,13 +86,21 @@ def generate_thumbnail(title: str, summary: str) -> str:
     return image_data
 
 
-def save_image(image_data: str, title: str) -> str:
-    """Save the base64 image to a file and return the filename."""
-    filename = f"{slugify(title)}.png"
+def decode_image(image_data: str) -> bytes:
+    """Decode the base64 image returned by the API."""
+    image_bytes = base64.b64decode(image_data)
+    metrics.count("image_generator_generated_image_bytes", len(image_bytes))
+    return image_bytes
+
+
+def save_image(image_bytes: bytes, article_id: str) -> str:
+    """
+    Save the decoded image to a file named after the article id and return the filename.
+    The image processor resolves the article from the filename with one primary-key query.
+    """
+    filename = f"{article_id}.png"
     filepath = IMAGES_DIR / filename
 
-    # Decode base64 and save
-    image_bytes = base64.b64decode(image_data)
     with open(filepath, "wb") as f:
         f.write(image_bytes)
 
@@ -103,7 +111,7 @@ def save_image(image_data: str, title: str) -> str:
 def update_article_image(article_id: str, filename: str) -> bool:
     """Update the article with the image filename."""
     try:
-        supabase.table("articles").update({
+        get_supabase().table("articles").update({
             "image_standard": filename
         }).eq("id", article_id).execute()
         print(f"  Updated article with image: {filename}")
@@ -113,37 +121,104 @@ def update_article_image(article_id: str, filename: str) -> bool:
         return False
 
 
-def main():
-    """Main image generator function."""
-    print("Starting Image Generator...")
+_image_processor = None
+_image_processor_lock = threading.Lock()
 
-    # Ensure images directory exists
-    ensure_images_directory()
 
-    # Get one article without an image
-    article = get_article_without_image()
+def get_image_processor():
+    """Load afbeelding-processor/image_processor.py as a module (once)."""
+    global _image_processor
+    with _image_processor_lock:
+        if _image_processor is None:
+            spec = importlib.util.spec_from_file_location("image_processor", IMAGE_PROCESSOR_PATH)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _image_processor = module
+    return _image_processor
+
+
+def publish_inline(article_id: str, image_bytes: bytes) -> bool:
+    """Create, upload and link all WebP variants straight from the decoded image bytes."""
+    processor = get_image_processor()
+
+    # Pillow reads the bytes through a BytesIO, which shares the buffer instead of copying it
+    variants = processor.process_image(image_bytes, name_prefix=article_id)
+    return processor.publish_article_images(article_id, variants)
 
-    if not article:
-        print("No articles without images found.")
-        return
 
+def process_article(article: dict) -> bool:
+    """Generate, save and link the thumbnail for one article."""
+    label = article['title'][:40]
     print(f"\nProcessing: {article['title'][:60]}...")
 
     try:
         # Generate thumbnail
-        print("  Calling OpenAI Image API...")
-        image_data = generate_thumbnail(article['title'], article['summary'])
-
-        # Save image
-        filename = save_image(image_data, article['title'])
+        print(f"  [{label}] Calling OpenAI Image API...")
+        image_bytes = decode_image(generate_thumbnail(article['title'], article['summary']))
+
+        if INLINE_PIPELINE:
+            try:
+                if publish_inline(article['id'], image_bytes):
+                    print(f"  [{label}] Published image variants")
+                    metrics.count("image_generator_articles_saved")
+                    return True
+            except Exception as e:
+                print(f"  [{label}] Error creating variants, spilling PNG to disk: {e}")
+
+        # Save image for the image processor
+        filename = save_image(image_bytes, article['id'])
+        metrics.count("image_generator_images_spilled")
 
         # Update article in database
-        update_article_image(article['id'], filename)
-
-        print("\nImage generation complete!")
+        if update_article_image(article['id'], filename):
+            metrics.count("image_generator_articles_saved")
+            return True
+        metrics.count("image_generator_articles_errored")
+        return False
 
     except Exception as e:
-        print(f"  Error during image generation: {e}")
+        print(f"  [{label}] Error during image generation: {e}")
+        metrics.count("image_generator_articles_errored")
+        return False
+
+
+def main():
+    """Main image generator function."""
+    metrics.init("image_generator")
+    if not has_rows("articles", {"image_standard": "is.null"}):
+        print("No articles without images found.")
+        return
+
+    print("Starting Image Generator...")
+    print(f"Batch size: {BATCH_SIZE}, concurrency: {MAX_CONCURRENCY}, time budget: {TIME_BUDGET_SECONDS:.0f}s")
+
+    # Ensure images directory exists
+    ensure_images_directory()
+
+    deadline = time.monotonic() + TIME_BUDGET_SECONDS
+    last_id = ""
+    generated = 0
+    failed = 0
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+        # Keep taking batches until the backlog or the time budget runs out
+        while time.monotonic() < deadline:
+            articles = get_articles_without_image(BATCH_SIZE, after_id=last_id)
+            if not articles:
+                break
+
+            last_id = max(article['id'] for article in articles)
+            for ok in executor.map(process_article, articles):
+                if ok:
+                    generated += 1
+                else:
+                    failed += 1
+
+    if generated == 0 and failed == 0:
+        print("No articles without images found.")
+        return
+
+    print(f"\nImage generation complete! {generated} generated, {failed} failed.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Resize Benchmark
+Compares the "direct" and "cascade" resize paths of the image processor:
+CPU time and peak RSS per path (each measured in its own process), and the
+SSIM of every cascade variant against the direct variant.
+
+Usage:
+    python benchmark_resize.py [image.png ...] [--runs 3] [--min-ssim 0.98]
+
+Without images it uses the PNGs in ai-daily-webpage/images-input/articles/_done.
+Exits with status 1 when a variant falls below --min-ssim. Requires numpy.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_IMAGES_DIR = SCRIPT_DIR.parent.parent / "ai-daily-webpage" / "images-input" / "articles" / "_done"
+
+
+def load_image_processor():
+    """Import image_processor.py without needing real Supabase credentials."""
+    os.environ.setdefault("SUPABASE_URL", "http://localhost")
+    os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+    spec = importlib.util.spec_from_file_location("image_processor", SCRIPT_DIR / "image_processor.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def open_rgb(path: Path):
+    """Open an image the way process_image() does."""
+    from PIL import Image
+
+    img = Image.open(path)
+    img.load()
+    if img.mode in ('RGBA', 'P'):
+        img = img.convert('RGB')
+    return img
+
+
+def run_worker(mode: str, images: list, runs: int):
+    """Render all variants `runs` times in this process and print CPU time and peak RSS as JSON."""
+    processor = load_image_processor()
+    decoded = [open_rgb(Path(path)) for path in images]
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.process_time()
+    for _ in range(runs):
+        for img in decoded:
+            processor.create_variants(img, mode=mode)
+    cpu_seconds = time.process_time() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    print(json.dumps({
+        "mode": mode,
+        "cpu_seconds": cpu_seconds,
+        "peak_rss_mb": peak_rss * scale / 1024 / 1024,
+        "resize_rss_mb": (peak_rss - baseline_rss) * scale / 1024 / 1024,
+    }))
+
+
+def ssim(a, b) -> float:
+    """Mean SSIM of two same-sized images on luminance, over 8x8 blocks."""
+    import numpy as np
+
+    x = np.asarray(a.convert("L"), dtype=np.float64)
+    y = np.asarray(b.convert("L"), dtype=np.float64)
+    h, w = (x.shape[0] // 8) * 8, (x.shape[1] // 8) * 8
+    x = x[:h, :w].reshape(h // 8, 8, w // 8, 8).swapaxes(1, 2).reshape(-1, 64)
+    y = y[:h, :w].reshape(h // 8, 8, w // 8, 8).swapaxes(1, 2).reshape(-1, 64)
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = x.mean(axis=1), y.mean(axis=1)
+    vx, vy = x.var(axis=1), y.var(axis=1)
+    cov = ((x - mx[:, None]) * (y - my[:, None])).mean(axis=1)
+    values = ((2 * mx * my + c1) * (2 * cov + c2)) / ((mx ** 2 + my ** 2 + c1) * (vx + vy + c2))
+    return float(values.mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="PNG files to benchmark")
+    parser.add_argument("--runs", type=int, default=3, help="render every image this many times per path")
+    parser.add_argument("--min-ssim", type=float, default=0.98, help="lowest acceptable SSIM per variant")
+    parser.add_argument("--worker", choices=["direct", "cascade"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    images = args.images or sorted(str(path) for path in DEFAULT_IMAGES_DIR.glob("*.png"))
+    if not images:
+        parser.error("no images given and none found in the default directory")
+
+    if args.worker:
+        run_worker(args.worker, images, args.runs)
+        return
+
+    print(f"Benchmarking {len(images)} image(s), {args.runs} run(s) per path\n")
+
+    results = {}
+    for mode in ("direct", "cascade"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", mode, "--runs", str(args.runs), *images],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{mode:>8}: {results[mode]['cpu_seconds']:.2f}s CPU, "
+            f"peak RSS {results[mode]['peak_rss_mb']:.0f} MB "
+            f"(+{results[mode]['resize_rss_mb']:.0f} MB while resizing)"
+        )
+
+    speedup = results["direct"]["cpu_seconds"] / max(results["cascade"]["cpu_seconds"], 1e-9)
+    print(f"\nCascade CPU speedup: {speedup:.2f}x\n")
+
+    # Compare every cascade variant with the direct variant
+    processor = load_image_processor()
+    worst = 1.0
+    for path in images:
+        img = open_rgb(Path(path))
+        direct = dict(processor.create_variants(img, mode="direct"))
+        for filename, variant in processor.create_variants(img, mode="cascade"):
+            score = ssim(direct[filename], variant)
+            worst = min(worst, score)
+            marker = "" if score >= args.min_ssim else "  <-- below threshold"
+            print(f"  {Path(path).name} {filename}: SSIM {score:.4f}{marker}")
+
+    print(f"\nLowest SSIM: {worst:.4f} (threshold {args.min_ssim})")
+    if worst < args.min_ssim:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
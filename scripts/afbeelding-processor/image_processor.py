@@ -4,21 +4,33 @@ Image Processor
 Processes generated PNG images, creates optimized variants, and uploads to Supabase Storage.
 """
 
+from __future__ import annotations
+
+import io
 import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from datetime import datetime, timezone
-from PIL import Image
-from supabase import create_client, Client
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
 
+# Shared instrumentation, clients and process pools (scripts/pipeline_metrics.py,
+# scripts/pipeline_clients.py, scripts/pipeline_workers.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import pipeline_metrics as metrics  # noqa: E402
+import pipeline_workers  # noqa: E402
+from pipeline_clients import get_supabase  # noqa: E402
+
+if TYPE_CHECKING:
+    from PIL import Image
+
 # Load environment variables
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 # Directories
 SCRIPT_DIR = Path(__file__).parent
@@ -42,6 +54,25 @@ SIZES_1_1 = [
     ((768, 768), "list_600.webp"),
 ]
 
+# Resize strategy: "cascade" crops once per aspect ratio and downscales each variant
+# from the next larger one; "direct" resizes every variant from the full image
+RESIZE_MODE = os.getenv("IMAGE_RESIZE_MODE", "cascade")
+# WebP encoding: quality and method (0 = fastest, 6 = smallest files; Pillow default 4)
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "85"))
+WEBP_METHOD = int(os.getenv("IMAGE_WEBP_METHOD", "4"))
+
+# Variant encoding runs on a process pool. Every worker holds at most one decoded
+# image, so the pool size also caps the number of decoded images in memory.
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+MAX_IN_FLIGHT_IMAGES = int(os.getenv("IMAGE_MAX_IN_FLIGHT", "4"))
+
+# Variants are encoded in memory; set to 1 to also write them to IMAGES_DIR for debugging
+KEEP_TEMP_FILES = os.getenv("IMAGE_KEEP_TEMP_FILES", "0") == "1"
+
+# Storage uploads: parallel uploads per image and retries per object
+UPLOAD_CONCURRENCY = int(os.getenv("IMAGE_UPLOAD_CONCURRENCY", "7"))
+UPLOAD_RETRIES = int(os.getenv("IMAGE_UPLOAD_RETRIES", "3"))
+
 # Mapping for database columns
 DB_COLUMN_MAPPING = {
     "hero_1600.webp": "image_large",
@@ -59,13 +90,33 @@ def get_png_files():
     return list(IMAGES_DIR.glob("*.png"))
 
 
-def get_article_by_image_filename(filename: str):
-    """Find article by image_standard filename."""
-    # The image_generator stores the filename in image_standard
-    response = supabase.table("articles").select("id").eq("image_standard", filename).limit(1).execute()
-    if response.data and len(response.data) > 0:
-        return response.data[0]
-    return None
+UUID_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def get_article_ids_for_images(png_files: list) -> dict:
+    """
+    Resolve the article id of every PNG file in one batched query.
+    The generator names images after the article id; older, slug-named files
+    are matched on the filename stored in image_standard instead.
+    Returns a dict of png_path to article id for the files that were found.
+    """
+    by_id = {path.stem: path for path in png_files if UUID_PATTERN.match(path.stem)}
+    by_filename = {path.name: path for path in png_files if path.stem not in by_id}
+
+    article_ids = {}
+    if by_id:
+        response = get_supabase().table("articles").select("id").in_("id", list(by_id)).execute()
+        for row in response.data or []:
+            article_ids[by_id[row["id"]]] = row["id"]
+
+    if by_filename:
+        response = get_supabase().table("articles").select("id, image_standard").in_(
+            "image_standard", list(by_filename)
+        ).execute()
+        for row in response.data or []:
+            article_ids[by_filename[row["image_standard"]]] = row["id"]
+
+    return article_ids
 
 
 def center_crop_square(img: Image.Image) -> Image.Image:
@@ -108,14 +159,66 @@ def resize_image(img: Image.Image, size: tuple, crop_square: bool = False, crop_
         img = center_crop_square(img)
     elif crop_16_9:
         img = center_crop_16_9(img)
+
+    from PIL import Image
+
     return img.resize(size, Image.Resampling.LANCZOS)
 
 
-def process_image(png_path: Path) -> dict:
-    """Process a PNG image and create all variants."""
-    variants = {}
+def resize_cascade(img: Image.Image, sizes: list) -> list:
+    """Resize an already cropped image to every size, each from the nearest larger variant."""
+    from PIL import Image
 
-    with Image.open(png_path) as img:
+    sizes = sorted(sizes, key=lambda entry: entry[0][0], reverse=True)
+
+    # A source of at least 4x the largest variant is first reduced by an integer
+    # factor (cheap box average) to no less than 2x, so LANCZOS still has detail to
+    # work with. Generated images (up to 1792px) are never that large.
+    largest = sizes[0][0]
+    factor = min(img.width // (2 * largest[0]), img.height // (2 * largest[1]))
+    current = img.reduce(factor) if factor >= 2 else img
+
+    resized = []
+    for size, filename in sizes:
+        current = current.resize(size, Image.Resampling.LANCZOS)
+        resized.append((filename, current))
+    return resized
+
+
+def create_group_variants(img: Image.Image, group: str, mode: str = RESIZE_MODE) -> list:
+    """Create the (filename, image) variants of one aspect ratio group ("16_9" or "1_1")."""
+    crop_16_9 = group == "16_9"
+    sizes = SIZES_16_9 if crop_16_9 else SIZES_1_1
+
+    if mode == "direct":
+        return [
+            (filename, resize_image(img, size, crop_square=not crop_16_9, crop_16_9=crop_16_9))
+            for size, filename in sizes
+        ]
+
+    # Crop once per aspect ratio, then cascade down the size ladder
+    cropped = center_crop_16_9(img) if crop_16_9 else center_crop_square(img)
+    return resize_cascade(cropped, sizes)
+
+
+def create_variants(img: Image.Image, mode: str = RESIZE_MODE) -> list:
+    """Create all (filename, image) variants for an RGB image."""
+    return create_group_variants(img, "16_9", mode) + create_group_variants(img, "1_1", mode)
+
+
+def encode_variants(source, prefix: str) -> dict:
+    """
+    Decode the image once, create all variants and encode them as WebP.
+    Runs in a worker process; `source` is a path or the raw image bytes.
+    Returns a dict of filename to encoded bytes.
+    """
+    from PIL import Image
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    variants = {}
+    with Image.open(source) as img:
         # Convert to RGB if necessary (for webp compatibility)
         if img.mode in ('RGBA', 'P'):
             img = img.convert('RGB')
@@ -124,133 +227,171 @@ def process_image(png_path: Path) -> dict:
         width, height = img.size
         print(f"  Input image: {width}x{height} (ratio: {width/height:.2f})")
 
-        # Generate 16:9 variants (hero images)
-        # First crop to 16:9 if needed, then resize
-        for size, filename in SIZES_16_9:
-            resized = resize_image(img, size, crop_16_9=True)
-            temp_path = IMAGES_DIR / f"temp_{filename}"
-            resized.save(temp_path, 'WEBP', quality=85)
-            variants[filename] = temp_path
-
-        # Generate 1:1 variants (list images - center crop from original)
-        for size, filename in SIZES_1_1:
-            resized = resize_image(img, size, crop_square=True)
-            temp_path = IMAGES_DIR / f"temp_{filename}"
-            resized.save(temp_path, 'WEBP', quality=85)
-            variants[filename] = temp_path
-
-    return variants
-
+        # One aspect ratio group at a time, so only one group's resized images are in memory
+        for group in ("16_9", "1_1"):
+            for filename, resized in create_group_variants(img, group):
+                buffer = io.BytesIO()
+                resized.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=WEBP_METHOD)
+                variants[filename] = buffer.getvalue()
 
-def upload_to_storage(file_path: Path, storage_path: str) -> str:
-    """Upload file to Supabase Storage and return public URL."""
-    with open(file_path, 'rb') as f:
-        file_data = f.read()
-
-    # Upload to storage
-    supabase.storage.from_(BUCKET_NAME).upload(
-        storage_path,
-        file_data,
-        {"content-type": "image/webp", "upsert": "true"}
-    )
-
-    # Get public URL
-    public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(storage_path)
-    return public_url
+                if KEEP_TEMP_FILES:
+                    (IMAGES_DIR / f"temp_{prefix}{filename}").write_bytes(variants[filename])
 
+    return variants
 
-def update_article_images(article_id: str, image_urls: dict) -> bool:
-    """Update article with image URLs."""
-    try:
-        supabase.table("articles").update(image_urls).eq("id", article_id).execute()
-        return True
-    except Exception as e:
-        print(f"  Error updating article: {e}")
-        return False
 
+@metrics.timed()
+def process_image(source, name_prefix: str = "", executor: Optional[ProcessPoolExecutor] = None) -> dict:
+    """
+    Process an image and create all variants.
+    `source` is a path or the raw image bytes. With an executor, the image is decoded
+    and encoded in a worker process; the speedup comes from running several images
+    on different cores at once, each image still uses one core.
+    """
+    prefix = f"{name_prefix}_" if name_prefix else ""
 
-def cleanup_files(png_path: Path, variants: dict):
-    """Remove local PNG and temporary webp files."""
-    # Remove original PNG
-    if png_path.exists():
-        png_path.unlink()
-        print(f"  Deleted: {png_path.name}")
+    if executor is None:
+        return encode_variants(source, prefix)
+    return executor.submit(encode_variants, source, prefix).result()
 
-    # Remove temporary webp files
-    for temp_path in variants.values():
-        if temp_path.exists():
-            temp_path.unlink()
 
+@metrics.timed()
+def upload_to_storage(file_data: bytes, storage_path: str) -> str:
+    """Upload encoded image bytes to Supabase Storage (with retries) and return the public URL."""
+    for attempt in range(UPLOAD_RETRIES + 1):
+        try:
+            get_supabase().storage.from_(BUCKET_NAME).upload(
+                storage_path,
+                file_data,
+                {"content-type": "image/webp", "upsert": "true"}
+            )
+            break
+        except Exception as e:
+            if attempt == UPLOAD_RETRIES:
+                raise
+            metrics.count("image_processor_upload_retries")
+            print(f"    Retrying upload of {storage_path} after error: {e}")
+            time.sleep(2 ** attempt)
 
-def process_single_image(png_path: Path) -> bool:
-    """Process a single PNG image end-to-end."""
-    filename = png_path.name  # full filename with extension
-    print(f"\nProcessing: {filename}")
+    metrics.count("image_processor_upload_bytes", len(file_data))
+    return public_storage_url(storage_path)
 
-    # Find article by image_standard field
-    article = get_article_by_image_filename(filename)
-    if not article:
-        print(f"  Article not found for image: {filename}")
-        return False
 
-    article_id = article['id']
-    print(f"  Found article ID: {article_id}")
+def public_storage_url(storage_path: str) -> str:
+    """Public URL of an object in the (public) storage bucket, computed without an API call."""
+    return f"{SUPABASE_URL.rstrip('/')}/storage/v1/object/public/{BUCKET_NAME}/{storage_path}"
 
-    # Process image into variants
-    print("  Creating image variants...")
-    variants = process_image(png_path)
-    print(f"  Created {len(variants)} variants")
 
-    # Upload all variants
+def upload_article_images(article_id: str, variants: dict) -> Optional[dict]:
+    """
+    Upload all variants and return the article row to write: id, the image
+    URL columns and published_at. Returns None if a variant that is linked
+    from a database column failed to upload, so the article is not published
+    without its images.
+    """
+    # Upload all variants in parallel over the client's pooled connection
     print("  Uploading to Supabase Storage...")
-    image_urls = {}
+    row = {"id": article_id}
+    failed = []
 
-    for filename, temp_path in variants.items():
-        storage_path = f"articles/{article_id}/{filename}"
+    with ThreadPoolExecutor(max_workers=UPLOAD_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(upload_to_storage, data, f"articles/{article_id}/{filename}"): filename
+            for filename, data in variants.items()
+        }
+
+    for future in as_completed(futures):
+        filename = futures[future]
         try:
-            public_url = upload_to_storage(temp_path, storage_path)
+            public_url = future.result()
 
             # Check if this filename maps to a database column
             if filename in DB_COLUMN_MAPPING:
                 column = DB_COLUMN_MAPPING[filename]
-                image_urls[column] = public_url
+                row[column] = public_url
                 print(f"    Uploaded {filename} → {column}")
             else:
                 print(f"    Uploaded {filename}")
         except Exception as e:
             print(f"    Error uploading {filename}: {e}")
+            failed.append(filename)
+
+    missing = [filename for filename in failed if filename in DB_COLUMN_MAPPING]
+    if missing:
+        print(f"  Not publishing, {len(missing)} linked variant(s) failed to upload: {', '.join(sorted(missing))}")
+        return None
+
+    # Setting published_at publishes the article
+    row["published_at"] = datetime.now(timezone.utc).isoformat()
+    return row
+
+
+def update_articles(rows: list) -> set:
+    """
+    Write the image columns and published_at of all rows. Several rows go in one
+    publish_article_images() RPC call (see sql/publish_article_images.sql); a single
+    row, or a failed RPC, falls back to one update per row.
+    Returns the ids of the articles that were updated.
+    """
+    if len(rows) > 1:
+        try:
+            response = get_supabase().rpc("publish_article_images", {"p_rows": rows}).execute()
+            return {row["id"] for row in response.data or []}
+        except Exception as e:
+            print(f"  Error in bulk update, updating articles one by one: {e}")
 
-    # Update database with image URLs
-    if image_urls:
-        print("  Updating database with image URLs...")
-        if update_article_images(article_id, image_urls):
-            print(f"  Updated {len(image_urls)} image columns")
-        else:
-            print("  Failed to update database")
-            return False
+    updated = set()
+    for row in rows:
+        values = {column: value for column, value in row.items() if column != "id"}
+        try:
+            get_supabase().table("articles").update(values).eq("id", row["id"]).execute()
+            updated.add(row["id"])
+        except Exception as e:
+            print(f"  Error updating article {row['id']}: {e}")
+    return updated
 
-    # Set published_at to publish the article
-    print("  Setting published_at timestamp...")
-    now = datetime.now(timezone.utc).isoformat()
 
-    try:
-        supabase.table("articles").update({
-            "published_at": now
-        }).eq("id", article_id).execute()
-        print(f"  Article published at: {now}")
-    except Exception as e:
-        print(f"  Error setting published_at: {e}")
+def publish_article_images(article_id: str, variants: dict) -> bool:
+    """Upload all variants, store their URLs on the article and publish it (one database write)."""
+    row = upload_article_images(article_id, variants)
+    if row is None or article_id not in update_articles([row]):
         return False
 
-    # Cleanup
-    print("  Cleaning up local files...")
-    cleanup_files(png_path, variants)
-
+    print(f"  Updated {len(row) - 2} image columns, published at: {row['published_at']}")
     return True
 
 
+def cleanup_files(png_path: Path):
+    """Remove the local PNG once its variants are published."""
+    if png_path.exists():
+        png_path.unlink()
+        print(f"  Deleted: {png_path.name}")
+
+
+def process_single_image(png_path: Path, article_id: str, executor: Optional[ProcessPoolExecutor] = None) -> Optional[dict]:
+    """
+    Create and upload the variants of a single PNG image; returns the article row to write,
+    or None if it failed (the PNG is kept for the next run).
+    """
+    print(f"\nProcessing: {png_path.name}")
+    print(f"  Article ID: {article_id}")
+
+    try:
+        # Process image into variants
+        print("  Creating image variants...")
+        variants = process_image(png_path, name_prefix=png_path.stem, executor=executor)
+        print(f"  Created {len(variants)} variants")
+
+        return upload_article_images(article_id, variants)
+    except Exception as e:
+        # One bad file must not stop the others from being published
+        print(f"  Error processing {png_path.name}: {e}")
+        return None
+
+
 def main():
     """Main image processor function."""
+    metrics.init("image_processor")
     print("Starting Image Processor...")
 
     # Get all PNG files
@@ -262,11 +403,34 @@ def main():
 
     print(f"Found {len(png_files)} PNG file(s) to process")
 
-    # Process each file
-    success_count = 0
+    # Find the articles for all files at once
+    article_ids = get_article_ids_for_images(png_files)
     for png_path in png_files:
-        if process_single_image(png_path):
-            success_count += 1
+        if png_path not in article_ids:
+            print(f"Article not found for image: {png_path.name}")
+    jobs = list(article_ids.items())
+
+    # Process files concurrently; the process pool bounds CPU use and decoded images in memory
+    workers = max(1, min(IMAGE_WORKERS, MAX_IN_FLIGHT_IMAGES))
+    if workers > 1:
+        print(f"Encoding on {workers} worker processes")
+        with pipeline_workers.process_pool(workers, __name__, __file__) as executor, \
+                ThreadPoolExecutor(max_workers=workers) as file_executor:
+            rows = list(file_executor.map(lambda job: process_single_image(*job, executor), jobs))
+    else:
+        rows = [process_single_image(png_path, article_id) for png_path, article_id in jobs]
+
+    # Write all articles at once, then remove the PNGs of the published ones;
+    # images whose uploads failed keep their PNG for the next run
+    print("\nUpdating database with image URLs...")
+    updated = update_articles([row for row in rows if row])
+    metrics.count("image_processor_articles_saved", len(updated))
+    metrics.count("image_processor_articles_errored", len(png_files) - len(updated))
+    for png_path, article_id in jobs:
+        if article_id in updated:
+            cleanup_files(png_path)
+
+    success_count = len(updated)
 
     print(f"\nProcessing complete. {success_count}/{len(png_files)} images processed successfully.")
 
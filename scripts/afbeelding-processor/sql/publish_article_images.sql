@@ -0,0 +1,34 @@
+-- Bulk update of article image columns for the image processor.
+-- Writes the image URLs and published_at of many articles in one call,
+-- instead of one PostgREST request per article.
+--
+-- p_rows: [{"id": "...", "image_large": "...", ..., "published_at": "..."}]
+-- Image columns missing from a row keep their current value.
+
+CREATE OR REPLACE FUNCTION publish_article_images(p_rows jsonb)
+RETURNS TABLE (id uuid)
+LANGUAGE sql
+AS $$
+  UPDATE articles AS a
+  SET image_large = COALESCE(r.image_large, a.image_large),
+      image_standard = COALESCE(r.image_standard, a.image_standard),
+      image_tablet = COALESCE(r.image_tablet, a.image_tablet),
+      image_mobile = COALESCE(r.image_mobile, a.image_mobile),
+      image_list = COALESCE(r.image_list, a.image_list),
+      published_at = r.published_at
+  FROM jsonb_to_recordset(p_rows) AS r(
+    id uuid,
+    image_large text,
+    image_standard text,
+    image_tablet text,
+    image_mobile text,
+    image_list text,
+    published_at timestamptz
+  )
+  WHERE a.id = r.id
+  RETURNING a.id;
+$$;
+
+-- Only the service role (used by the image processor) may call this
+REVOKE EXECUTE ON FUNCTION publish_article_images(jsonb) FROM public, anon, authenticated;
+GRANT EXECUTE ON FUNCTION publish_article_images(jsonb) TO service_role;
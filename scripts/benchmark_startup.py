@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Guards the startup cost of the pipeline scripts with `python -X importtime`:
+- "load": import each script without running main() and sum its import time
+- "idle": run the processor and image generator against a local PostgREST
+  stand-in that has no work, which should exit without the heavy imports
+
+Usage:
+    python benchmark_startup.py [--runs 3] [--max-load-ms 300] [--max-idle-ms 500]
+
+Exits with status 1 when a heavy module is imported at load or on an idle
+run, or when a script is slower than the given budget.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+
+SCRIPTS = {
+    "scraper": SCRIPT_DIR / "scraper" / "main.py",
+    "processor": SCRIPT_DIR / "tekstverwerker" / "processor.py",
+    "image_generator": SCRIPT_DIR / "afbeelding-generator" / "image_generator.py",
+    "image_processor": SCRIPT_DIR / "afbeelding-processor" / "image_processor.py",
+}
+
+# Scripts whose main() starts with the "is there work?" check
+IDLE_SCRIPTS = ("processor", "image_generator")
+
+# Modules that must only be imported once there is work to do
+HEAVY_MODULES = {"supabase", "openai", "tiktoken", "trafilatura", "bs4", "lxml", "selectolax", "PIL", "numpy"}
+
+LOAD_SNIPPET = """
+import importlib.util, sys
+spec = importlib.util.spec_from_file_location(sys.argv[1], sys.argv[2])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+"""
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+class EmptyPostgREST(BaseHTTPRequestHandler):
+    """Answers every query with an empty result set."""
+
+    def do_GET(self):
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_importtime(stderr: str) -> tuple:
+    """Return the total import time (ms) and the set of top-level packages imported."""
+    total_us = 0
+    packages = set()
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        packages.add(name.split(".")[0])
+        if not indent:
+            total_us += int(cumulative)
+    return total_us / 1000, packages
+
+
+def measure(command: list, env: dict) -> dict:
+    """Run a command under -X importtime; return wall time, import time and heavy imports."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *command],
+        env=env, capture_output=True, text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"{command} failed:\n{result.stderr[-2000:]}")
+
+    import_ms, packages = parse_importtime(result.stderr)
+    return {"wall_ms": wall_ms, "import_ms": import_ms, "heavy": sorted(packages & HEAVY_MODULES)}
+
+
+def best_of(runs: int, command: list, env: dict) -> dict:
+    """Fastest of `runs` measurements, to filter out noise from a cold disk cache."""
+    results = [measure(command, env) for _ in range(runs)]
+    return min(results, key=lambda result: result["wall_ms"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="measure every script this many times")
+    parser.add_argument("--max-load-ms", type=float, help="highest acceptable import time per script")
+    parser.add_argument("--max-idle-ms", type=float, help="highest acceptable wall time of an idle run")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EmptyPostgREST)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_URL": f"http://127.0.0.1:{server.server_port}",
+        "SUPABASE_SERVICE_KEY": "benchmark",
+        "OPENAI_API_KEY": "benchmark",
+    })
+
+    results = {}
+    for name, path in SCRIPTS.items():
+        results[f"{name} load"] = best_of(args.runs, ["-c", LOAD_SNIPPET, name, str(path)], env)
+    for name in IDLE_SCRIPTS:
+        results[f"{name} idle"] = best_of(args.runs, [str(SCRIPTS[name])], env)
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+    failed = False
+    for label, result in results.items():
+        problems = []
+        if result["heavy"]:
+            problems.append(f"imports {', '.join(result['heavy'])}")
+        if label.endswith("load") and args.max_load_ms and result["import_ms"] > args.max_load_ms:
+            problems.append(f"import time over {args.max_load_ms:.0f} ms")
+        if label.endswith("idle") and args.max_idle_ms and result["wall_ms"] > args.max_idle_ms:
+            problems.append(f"wall time over {args.max_idle_ms:.0f} ms")
+        failed = failed or bool(problems)
+
+        if not args.json:
+            marker = f"  <-- {'; '.join(problems)}" if problems else ""
+            print(f"{label:>22}: {result['wall_ms']:7.1f} ms wall, {result['import_ms']:7.1f} ms imports{marker}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
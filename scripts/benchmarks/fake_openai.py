@@ -0,0 +1,268 @@
+"""
+Fake OpenAI API for the benchmarks.
+
+- POST /v1/chat/completions: a valid article rewrite (as the processor expects it),
+  built from the title and text in the request; streamed as server-sent events
+  when the request asks for it, with usage in the last chunk
+- POST /v1/images/generations: one canned 1792x1024 PNG as base64
+- POST /v1/files, GET /v1/files/<id>/content, POST /v1/batches and
+  GET /v1/batches/<id>: the Batch API as used by PROCESSOR_MODE=batch; a
+  batch completes once its delay has passed, with a rewrite for every line
+
+Chat and image requests answer after a configurable delay; a streamed answer
+spreads its delay over the chunks. Set OPENAI_BASE_URL to the returned base_url.
+"""
+
+import base64
+import email.parser
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A topic id from the processor's TOPICS
+TOPIC_ID = "3afab735-27f5-4180-af14-fc7befb49a17"
+
+STREAM_CHUNKS = 20
+
+
+def canned_png() -> bytes:
+    """A photo-like test image: a gradient with noise, so WebP encoding does real work."""
+    from PIL import Image, ImageChops
+
+    gradient = Image.linear_gradient("L").resize((1792, 1024))
+    noise = Image.effect_noise((1792, 1024), 40)
+    image = Image.merge("RGB", (gradient, ImageChops.add(gradient, noise, scale=2), noise))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def rewrite(messages: list) -> dict:
+    """A rewrite that passes validate_ai_data(), unique per source article."""
+    user = messages[1]["content"] if len(messages) > 1 else ""
+    title = re.search(r"ORIGINELE TITEL: (.*)", user)
+    title = (title.group(1) if title else "Nieuws")[:70]
+    digest = hashlib.sha256(user.encode("utf-8")).hexdigest()
+    paragraphs = [line for line in user.split("\n")[3:] if line.strip()][:6]
+
+    return {
+        "title": title,
+        "summary": "Eerste zin van de samenvatting. Tweede zin met meer context. Derde zin over de gevolgen.",
+        "body": "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs) or "<p>Geen tekst.</p>",
+        "read_time_minutes": 3,
+        "seo_title": title[:60],
+        "seo_description": f"{title[:120]} - het laatste tech-nieuws.",
+        "slug": f"tech-nieuws-{digest[:8]}",
+        "structured_data": {"@context": "https://schema.org", "@type": "NewsArticle", "headline": title},
+        "primary_topic_id": TOPIC_ID,
+    }
+
+
+def completion(request: dict) -> tuple:
+    """The rewrite for a chat request as (content, usage)."""
+    content = json.dumps(rewrite(request.get("messages", [])), ensure_ascii=False)
+    prompt_tokens = sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(content) // 4,
+        "total_tokens": prompt_tokens + len(content) // 4,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+    return content, usage
+
+
+def chat_response(request: dict) -> dict:
+    """A complete (non-streamed) chat.completion object for a request."""
+    content, usage = completion(request)
+    return {
+        "id": "chatcmpl-benchmark",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", ""),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": usage,
+    }
+
+
+class BatchStore:
+    """Uploaded files and submitted batches, guarded by one lock."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file = {
+            "id": f"file-{uuid.uuid4().hex[:24]}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file["id"]] = (file, content)
+        return file
+
+    def create_batch(self, request: dict) -> dict:
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}",
+            "object": "batch",
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+        }
+        with self.lock:
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def get_batch(self, batch_id: str) -> dict:
+        """The batch; runs it once its delay has passed."""
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] != "in_progress" or time.time() < batch["created_at"] + self.latency:
+                return dict(batch)
+            _, content = self.files[batch["input_file_id"]]
+
+        lines = []
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            task = json.loads(line)
+            lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": task["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": chat_response(task["body"])},
+                "error": None,
+            }, ensure_ascii=False))
+        output = self.add_file("\n".join(lines).encode("utf-8"), f"{batch_id}_output.jsonl", "batch_output")
+
+        with self.lock:
+            batch.update({
+                "status": "completed",
+                "output_file_id": output["id"],
+                "completed_at": int(time.time()),
+                "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+            })
+            return dict(batch)
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict:
+    """The parts of a multipart/form-data body as {name: (filename, bytes)}."""
+    message = email.parser.BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    return {
+        part.get_param("name", header="content-disposition"): (part.get_filename(), part.get_payload(decode=True))
+        for part in message.get_payload()
+    }
+
+
+def make_handler(chat_latency: float, image_latency: float, image_b64: str, batches: BatchStore):
+
+    class OpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_json(self, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            match = re.search(r"/files/([^/]+)/content$", self.path)
+            with batches.lock:
+                stored = batches.files.get(match.group(1)) if match else None
+            if stored:
+                _, content = stored
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+
+            match = re.search(r"/batches/([^/]+)$", self.path)
+            if match and match.group(1) in batches.batches:
+                self.send_json(batches.get_batch(match.group(1)))
+                return
+            self.send_error(404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+
+            if self.path.endswith("/files"):
+                parts = parse_multipart(self.headers["Content-Type"], body)
+                filename, content = parts["file"]
+                purpose = parts["purpose"][1].decode("utf-8")
+                self.send_json(batches.add_file(content, filename, purpose))
+                return
+
+            request = json.loads(body or b"{}")
+            if self.path.endswith("/images/generations"):
+                time.sleep(image_latency)
+                self.send_json({"created": int(time.time()), "data": [{"b64_json": image_b64}]})
+            elif self.path.endswith("/chat/completions"):
+                self.chat(request)
+            elif self.path.endswith("/batches"):
+                self.send_json(batches.create_batch(request))
+            else:
+                self.send_error(404)
+
+        def chat(self, request: dict):
+            if not request.get("stream"):
+                time.sleep(chat_latency)
+                self.send_json(chat_response(request))
+                return
+
+            content, usage = completion(request)
+            base = {"id": "chatcmpl-benchmark", "created": int(time.time()), "model": request.get("model", "")}
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            size = -(-len(content) // STREAM_CHUNKS)
+            for start in range(0, len(content), size):
+                time.sleep(chat_latency / STREAM_CHUNKS)
+                chunk = {
+                    **base,
+                    "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            final = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return OpenAIHandler
+
+
+def start(chat_latency: float = 1.0, image_latency: float = 5.0, batch_latency: float = 0.0) -> tuple:
+    """Start the fake API on a free port. Returns (server, base_url)."""
+    image_b64 = base64.b64encode(canned_png()).decode("ascii")
+    batches = BatchStore(batch_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(chat_latency, image_latency, image_b64, batches))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
@@ -0,0 +1,241 @@
+"""
+News site fixtures for the benchmarks.
+
+Serves a source's index page, RSS feed and articles from a local HTTP server with
+injectable latency. Pages come from the fixture pages in fixtures/<source>/
+when present (the feed is built from the fixture articles), and are generated
+otherwise: deterministic HTML with a different text per article, so the
+processor's near-duplicate check and response cache see distinct articles.
+
+fixtures/<source>/origin.txt says where the fixture pages come from. The
+committed ones are synthetic: built offline after the page layout of the live
+sites (scripts, JSON-LD, navigation, related links and footers around the
+article), with made-up article text. Replace them with a recording of the live
+sites with:
+    python fake_sites.py record [--articles 10]
+"""
+
+import argparse
+import email.utils
+import hashlib
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+from xml.sax.saxutils import escape
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Index, feed and article link layout per source, matching the scraper's link patterns
+LAYOUTS = {
+    "nos": {"index": "/nieuws/tech", "feed": "/nosnieuwstech", "link_pattern": "/artikel/", "article": "/artikel/{n}-{slug}"},
+    "guardian": {"index": "/uk/technology", "feed": "/uk/technology/rss", "link_pattern": r"/technology/\d{4}/", "article": "/technology/2026/oct/18/{slug}-{n}"},
+}
+
+WORDS = (
+    "model chip data cloud kabinet toezicht onderzoek startup robot netwerk privacy algoritme "
+    "investering europa chatbot training energie datacenter beveiliging regels beurs software "
+    "hardware taalmodel overheid studie ethiek markt groei rechter autoriteit platform dienst "
+    "gebruikers modellen rekenkracht wetgeving consument innovatie universiteit laboratorium"
+).split()
+
+
+def fixture_path(source: str, path: str) -> Path:
+    name = "index" if path == LAYOUTS[source]["index"] else hashlib.sha256(path.encode()).hexdigest()[:16]
+    return FIXTURES_DIR / source / f"{name}.html"
+
+
+def article_paths(source: str, articles: int) -> list:
+    layout = LAYOUTS[source]
+    return [layout["article"].format(n=n, slug=f"tech-nieuws-{source}-{n}") for n in range(articles)]
+
+
+def linked_paths(source: str, index: str, origin: str) -> list:
+    """Paths of the article links on an index page, in page order."""
+    paths = []
+    for href in re.findall(r'href="([^"]+)"', index):
+        url = urlparse(urljoin(origin + "/", href))
+        if url.netloc == urlparse(origin).netloc and re.search(LAYOUTS[source]["link_pattern"], url.path) and url.path not in paths:
+            paths.append(url.path)
+    return paths
+
+
+def fixture_article_paths(source: str) -> list:
+    """The article paths of the fixture index page; empty without fixtures."""
+    index = fixture_path(source, LAYOUTS[source]["index"])
+    if not index.exists():
+        return []
+    return linked_paths(source, index.read_text(encoding="utf-8"), "http://fixture")
+
+
+def fixture_origin(source: str) -> Optional[str]:
+    """Where the fixture pages of a source come from (origin.txt); None without fixtures."""
+    if not fixture_path(source, LAYOUTS[source]["index"]).exists():
+        return None
+    origin = FIXTURES_DIR / source / "origin.txt"
+    return origin.read_text(encoding="utf-8").strip() if origin.exists() else "unknown origin"
+
+
+def generate_index(source: str, articles: int) -> str:
+    links = [f'<li><a href="{href}">Artikel {n}</a></li>' for n, href in enumerate(article_paths(source, articles))]
+    # Some navigation links the link pattern has to skip
+    links.append('<li><a href="/over-ons">Over ons</a></li><li><a href="#top">Top</a></li>')
+    return f"<html><head><title>{source} tech</title></head><body><ul>{''.join(links)}</ul></body></html>"
+
+
+def generate_feed(source: str, paths: list, base_url: str, fixtures: bool) -> str:
+    """An RSS feed with the full text of every article in content:encoded, newest first."""
+    items = []
+    for n, path in enumerate(paths):
+        page = article_page(source, path, fixtures).decode("utf-8")
+        title = re.sub(r"<[^>]+>", "", re.search(r"<h1[^>]*>(.*?)</h1>", page, re.S).group(1))
+        body = re.search(r"<article[^>]*>(.*?)</article>", page, re.S).group(1)
+        published = email.utils.formatdate(1_790_000_000 - n * 600, usegmt=True)
+        items.append(
+            f"<item><title>{escape(title)}</title><link>{base_url}{path}</link><pubDate>{published}</pubDate>"
+            f"<description>{escape(title)}</description><content:encoded>{escape(body)}</content:encoded></item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">'
+        f"<channel><title>{source} tech</title><link>{base_url}</link>{''.join(items)}</channel></rss>"
+    )
+
+
+def generate_article(path: str) -> str:
+    rng = random.Random(path)
+    title = " ".join(rng.choice(WORDS) for _ in range(7)).capitalize()
+    paragraphs = []
+    for _ in range(rng.randint(8, 14)):
+        sentence_count = rng.randint(3, 6)
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "." for _ in range(sentence_count)]
+        paragraphs.append(f"<p>{' '.join(sentences)}</p>")
+    return (
+        f"<html><head><title>{title}</title><meta property=\"og:title\" content=\"{title}\"></head>"
+        f"<body><nav><a href=\"/\">Home</a></nav><article><h1>{title}</h1>{''.join(paragraphs)}</article>"
+        f"<footer>Fixture {path}</footer></body></html>"
+    )
+
+
+def article_page(source: str, path: str, fixtures: bool) -> bytes:
+    """The fixture page for a path if there is one, else a generated article."""
+    page = fixture_path(source, path)
+    if fixtures and page.exists():
+        return page.read_bytes()
+    return generate_article(path).encode("utf-8")
+
+
+def make_handler(source: str, articles: int, latency: float, fixtures: bool):
+    layout = LAYOUTS[source]
+    index = fixture_path(source, layout["index"])
+    fixtures = fixtures and index.exists()
+    paths = fixture_article_paths(source) if fixtures else article_paths(source, articles)
+
+    class SiteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+
+            path = urlparse(self.path).path
+            if path == layout["index"]:
+                body = index.read_bytes() if fixtures else generate_index(source, articles).encode("utf-8")
+            elif path == layout["feed"]:
+                base_url = f"http://{self.headers.get('Host')}"
+                body = generate_feed(source, paths, base_url, fixtures).encode("utf-8")
+            elif re.search(layout["link_pattern"], path):
+                body = article_page(source, path, fixtures)
+            else:
+                self.send_error(404)
+                return
+
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SiteHandler
+
+
+def start(source: str, articles: int = 20, latency: float = 0.0, fixtures: bool = True) -> tuple:
+    """
+    Serve one source on its own port (so per-host rate limits apply per source). Returns (server, base_url).
+    With `fixtures` and fixture pages for the source, serves those and ignores `articles`.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(source, articles, latency, fixtures))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def scraper_sources(base_urls: dict, discovery: str = "html") -> list:
+    """The scraper's SOURCES, pointed at the local servers."""
+    return [
+        {
+            "name": source,
+            "url": base_urls[source] + LAYOUTS[source]["index"],
+            "discovery": discovery,
+            "feed_url": base_urls[source] + LAYOUTS[source]["feed"],
+            "link_pattern": LAYOUTS[source]["link_pattern"],
+            "base_url": base_urls[source],
+        }
+        for source in base_urls
+    ]
+
+
+def record(articles: int):
+    """Save the live index pages and their first articles as fixtures."""
+    import requests
+
+    live = {"nos": "https://nos.nl", "guardian": "https://www.theguardian.com"}
+    session = requests.Session()
+    session.headers["User-Agent"] = "Mozilla/5.0 (compatible; ai-daily-benchmark)"
+
+    for source, origin in live.items():
+        layout = LAYOUTS[source]
+        index = session.get(origin + layout["index"], timeout=30).text
+        # Make absolute links relative so they resolve to the local server
+        index = index.replace(origin, "")
+
+        paths = linked_paths(source, index, origin)
+
+        # Replace the previous fixtures of the source completely
+        source_dir = FIXTURES_DIR / source
+        source_dir.mkdir(parents=True, exist_ok=True)
+        for old in source_dir.glob("*.html"):
+            old.unlink()
+
+        fixture_path(source, layout["index"]).write_text(index, encoding="utf-8")
+        for path in paths[:articles]:
+            fixture_path(source, path).write_bytes(session.get(origin + path, timeout=30).content)
+            time.sleep(1)
+        recorded_at = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        (source_dir / "origin.txt").write_text(f"recorded from {origin}{layout['index']} on {recorded_at}\n", encoding="utf-8")
+        print(f"{source}: recorded index and {min(len(paths), articles)} articles")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["record"])
+    parser.add_argument("--articles", type=int, default=10, help="articles to record per source")
+    args = parser.parse_args()
+    record(args.articles)
@@ -0,0 +1,311 @@
+"""
+In-memory Supabase stand-in for the benchmarks.
+
+Implements the part of PostgREST and Storage the pipeline scripts use:
+- GET/POST/PATCH on /rest/v1/<table> with eq, neq, gt, gte, lt, lte, is, in
+  and or/and filters, select, order and limit; upserts with on_conflict
+- the claim_article_websites and publish_article_images RPCs (see the sql/ directories)
+- uploads to /storage/v1/object/<bucket>/<path>, of which only the size is kept
+
+GET /__state returns row and upload counts; POST /__reset empties everything.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlparse
+
+# Query parameters that are not filters
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class Database:
+    """Tables as lists of dicts, guarded by one lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.tables = {}
+            self.next_id = 1
+            self.uploads = {}
+
+    def rows(self, table: str) -> list:
+        return self.tables.setdefault(table, [])
+
+    def insert(self, table: str, row: dict) -> dict:
+        row = dict(row)
+        if "id" not in row:
+            # article_websites has integer ids, articles uuids (as in the real schema)
+            if table == "article_websites":
+                row["id"] = self.next_id
+                self.next_id += 1
+            else:
+                row["id"] = str(uuid.uuid4())
+        row.setdefault("created_at", now_iso())
+        if table == "articles":
+            for column in ("image_large", "image_standard", "image_tablet", "image_mobile", "image_list", "published_at"):
+                row.setdefault(column, None)
+        self.rows(table).append(row)
+        return row
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def split_top_level(text: str) -> list:
+    """Split on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        if char == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+
+def unquote_value(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def compare(actual, raw: str):
+    """Convert a filter value to the type of the column value."""
+    if isinstance(actual, bool):
+        return raw == "true"
+    if isinstance(actual, int):
+        return int(raw)
+    if isinstance(actual, float):
+        return float(raw)
+    return raw
+
+
+def matches(row: dict, column: str, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    operator, _, raw = expression.partition(".")
+    actual = row.get(column)
+
+    if operator == "is":
+        result = actual is None if raw == "null" else actual == (raw == "true")
+    elif operator == "in":
+        values = [unquote_value(value) for value in split_top_level(raw[1:-1])] if raw.strip("()") else []
+        result = actual is not None and any(actual == compare(actual, value) for value in values)
+    elif actual is None:
+        result = False
+    else:
+        value = compare(actual, unquote_value(raw))
+        result = {
+            "eq": lambda: actual == value,
+            "neq": lambda: actual != value,
+            "gt": lambda: actual > value,
+            "gte": lambda: actual >= value,
+            "lt": lambda: actual < value,
+            "lte": lambda: actual <= value,
+        }[operator]()
+    return not result if negate else result
+
+
+def matches_logic(row: dict, operator: str, body: str) -> bool:
+    """Evaluate an or=(...) / and(...) group."""
+    results = []
+    for part in split_top_level(body[1:-1]):
+        group = re.match(r"^(or|and)(\(.*\))$", part)
+        if group:
+            results.append(matches_logic(row, group.group(1), group.group(2)))
+        else:
+            column, _, expression = part.partition(".")
+            results.append(matches(row, column, expression))
+    return any(results) if operator == "or" else all(results)
+
+
+def filter_rows(rows: list, params: list) -> list:
+    result = []
+    for row in rows:
+        ok = True
+        for key, value in params:
+            if key in RESERVED_PARAMS:
+                continue
+            if key in ("or", "and"):
+                ok = matches_logic(row, key, value)
+            else:
+                ok = matches(row, key, value)
+            if not ok:
+                break
+        if ok:
+            result.append(row)
+    return result
+
+
+def shape(rows: list, params: dict) -> list:
+    """Apply order, limit and select."""
+    if "order" in params:
+        for term in reversed(params["order"].split(",")):
+            column, _, direction = term.partition(".")
+            rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+    if "limit" in params:
+        rows = rows[int(params.get("offset", 0)):int(params.get("offset", 0)) + int(params["limit"])]
+
+    select = params.get("select", "*")
+    if select.strip() == "*":
+        return [dict(row) for row in rows]
+    columns = [column.strip() for column in select.split(",")]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+def claim_article_websites(db: Database, args: dict) -> list:
+    now = now_iso()
+    lease = (datetime.now(timezone.utc) + timedelta(seconds=args["p_lease_seconds"])).isoformat()
+    candidates = [
+        row for row in sorted(db.rows("article_websites"), key=lambda row: row["id"])
+        if row.get("status") == "new"
+        or (row.get("status") == "processing" and (row.get("lease_expires_at") or now) < now)
+    ][:args["p_limit"]]
+    for row in candidates:
+        row.update({"status": "processing", "claimed_by": args["p_worker_id"], "lease_expires_at": lease})
+    return [dict(row) for row in candidates]
+
+
+def publish_article_images(db: Database, args: dict) -> list:
+    by_id = {row["id"]: row for row in db.rows("articles")}
+    updated = []
+    for values in args["p_rows"]:
+        row = by_id.get(values["id"])
+        if row is None:
+            continue
+        for column, value in values.items():
+            if column != "id" and (value is not None or column == "published_at"):
+                row[column] = value
+        updated.append({"id": row["id"]})
+    return updated
+
+
+RPCS = {"claim_article_websites": claim_article_websites, "publish_article_images": publish_article_images}
+
+
+def make_handler(db: Database, latency: float):
+
+    class SupabaseHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_json(self, status: int, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_body(self) -> bytes:
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def route(self):
+            url = urlparse(self.path)
+            params = parse_qsl(url.query, keep_blank_values=True)
+            return url.path, params, dict(params)
+
+        def do_GET(self):
+            path, params, named = self.route()
+            if path == "/__state":
+                with db.lock:
+                    state = {
+                        "tables": {name: len(rows) for name, rows in db.tables.items()},
+                        "uploads": len(db.uploads),
+                        "upload_bytes": sum(db.uploads.values()),
+                        "published": sum(1 for row in db.rows("articles") if row.get("published_at")),
+                    }
+                self.send_json(200, state)
+                return
+
+            time.sleep(latency)
+            table = path.rsplit("/", 1)[-1]
+            with db.lock:
+                rows = shape(filter_rows(db.rows(table), params), named)
+            self.send_json(200, rows)
+
+        def do_HEAD(self):
+            self.do_GET()
+
+        def do_POST(self):
+            path, params, named = self.route()
+            body = self.read_body()
+            if path == "/__reset":
+                db.reset()
+                self.send_json(200, {})
+                return
+
+            time.sleep(latency)
+            if path.startswith("/storage/v1/object/"):
+                key = unquote(path[len("/storage/v1/object/"):])
+                with db.lock:
+                    db.uploads[key] = len(body)
+                self.send_json(200, {"Key": key, "Id": str(uuid.uuid4())})
+                return
+
+            if path.startswith("/rest/v1/rpc/"):
+                name = path.rsplit("/", 1)[-1]
+                with db.lock:
+                    result = RPCS[name](db, json.loads(body or b"{}"))
+                self.send_json(200, result)
+                return
+
+            table = path.rsplit("/", 1)[-1]
+            payload = json.loads(body or b"[]")
+            rows = payload if isinstance(payload, list) else [payload]
+            conflict = named.get("on_conflict")
+            ignore = "ignore-duplicates" in (self.headers.get("Prefer") or "")
+
+            with db.lock:
+                inserted = []
+                for row in rows:
+                    if conflict:
+                        existing = [r for r in db.rows(table) if r.get(conflict) == row.get(conflict)]
+                        if existing:
+                            if not ignore:
+                                existing[0].update(row)
+                                inserted.append(dict(existing[0]))
+                            continue
+                    inserted.append(dict(db.insert(table, row)))
+            self.send_json(201, inserted)
+
+        def do_PATCH(self):
+            path, params, named = self.route()
+            values = json.loads(self.read_body() or b"{}")
+            time.sleep(latency)
+            table = path.rsplit("/", 1)[-1]
+            with db.lock:
+                rows = filter_rows(db.rows(table), params)
+                for row in rows:
+                    row.update(values)
+                result = [dict(row) for row in rows]
+            self.send_json(200, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SupabaseHandler
+
+
+def start(latency: float = 0.0) -> tuple:
+    """Start the stand-in on a free port. Returns (server, database, base_url)."""
+    db = Database()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(db, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, db, f"http://127.0.0.1:{server.server_port}"
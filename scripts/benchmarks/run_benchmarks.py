@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Offline Pipeline Benchmark
+Runs the pipeline entry points against local fakes, so no live news sites,
+Supabase project or paid OpenAI calls are needed:
+- fake_sites.py: news site fixtures with injectable latency
+- fake_supabase.py: in-memory PostgREST and Storage
+- fake_openai.py: canned chat and image responses after a delay
+
+Three scenarios, each starting from an empty database:
+- "scripts": scraper, processor, image generator and image processor one
+  after the other (the generator spills PNGs for the image processor)
+- "pipeline": scripts/pipeline.py
+- "batch": scraper, then the processor in Batch API mode twice: once to
+  submit the batch and once to ingest its results
+
+Every entry point runs in its own process with METRICS_JSONL set, and the
+report shows its wall time, throughput and the per-stage latency
+percentiles from pipeline_metrics. The report starts with where the news site
+pages come from (fake_sites.py), since extraction timings depend on them.
+
+Usage:
+    python run_benchmarks.py [--pages fixtures|generated] [--articles 20] [--discovery html|feed]
+                             [--chat-latency 1.0] [--image-latency 5.0]
+                             [--output results.json] [--baseline previous.json]
+                             [--env PROCESSOR_CONCURRENCY=8 ...]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).parent
+SCRIPTS_DIR = BENCHMARK_DIR.parent
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+import fake_openai  # noqa: E402
+import fake_sites  # noqa: E402
+import fake_supabase  # noqa: E402
+
+ENTRY_POINTS = {
+    "scraper": SCRIPTS_DIR / "scraper" / "main.py",
+    "processor": SCRIPTS_DIR / "tekstverwerker" / "processor.py",
+    "image_generator": SCRIPTS_DIR / "afbeelding-generator" / "image_generator.py",
+    "image_processor": SCRIPTS_DIR / "afbeelding-processor" / "image_processor.py",
+    "pipeline": SCRIPTS_DIR / "pipeline.py",
+    "batch_submit": SCRIPTS_DIR / "tekstverwerker" / "processor.py",
+    "batch_ingest": SCRIPTS_DIR / "tekstverwerker" / "processor.py",
+}
+
+SCENARIOS = {
+    "scripts": ["scraper", "processor", "image_generator", "image_processor"],
+    "pipeline": ["pipeline"],
+    "batch": ["scraper", "batch_submit", "batch_ingest"],
+}
+
+# Counter that measures the output of each entry point
+THROUGHPUT_COUNTERS = {
+    "scraper": "scraper_articles_saved",
+    "processor": "processor_articles_saved",
+    "image_generator": "image_generator_articles_saved",
+    "image_processor": "image_processor_articles_saved",
+    "pipeline": "stage_variants_done",
+    "batch_submit": "processor_batch_articles_submitted",
+    "batch_ingest": "processor_articles_saved",
+}
+
+# Settings for every run; the scraper's politeness limit would only measure the sleep
+DEFAULT_ENV = {
+    "SCRAPER_HOST_RATE": "1000",
+    "SCRAPER_HOST_BURST": "10",
+    "SCRAPER_HTTP_RETRIES": "0",
+}
+
+
+def load_module(name: str, path: Path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_driver(entry: str, sources: str, images_dir: str):
+    """Load an entry point, point it at the fixture sites and image directory, and run main()."""
+    module = load_module(entry, ENTRY_POINTS[entry])
+    if entry == "pipeline":
+        scraper, generator, image_processor = module.scraper, module.generator, module.image_processor
+    else:
+        scraper = generator = image_processor = module
+
+    if hasattr(scraper, "SOURCES"):
+        scraper.SOURCES = json.loads(sources)
+    for target in (generator, image_processor):
+        if hasattr(target, "IMAGES_DIR"):
+            target.IMAGES_DIR = Path(images_dir)
+    module.main()
+
+
+def read_summary(path: Path) -> dict:
+    """The last summary event of a METRICS_JSONL file."""
+    summary = {"counters": {}, "timers": {}}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            event = json.loads(line)
+            if event.get("type") == "summary":
+                summary = event
+    return summary
+
+
+def run_entry(entry: str, env: dict, work_dir: Path, sources: list) -> dict:
+    metrics_path = work_dir / f"{entry}.jsonl"
+    log_path = work_dir / f"{entry}.log"
+    run_env = {**env, "METRICS_JSONL": str(metrics_path)}
+
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        result = subprocess.run(
+            [sys.executable, __file__, "--driver", entry, json.dumps(sources), str(work_dir / "images")],
+            env=run_env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{entry} exited with {result.returncode}, see {log_path}")
+
+    summary = read_summary(metrics_path)
+    items = summary["counters"].get(THROUGHPUT_COUNTERS[entry], 0)
+    return {
+        "wall_seconds": round(wall, 3),
+        "items": items,
+        "items_per_second": round(items / wall, 3) if wall else 0,
+        "timers": summary["timers"],
+        "counters": summary["counters"],
+    }
+
+
+def print_report(results: dict, baseline: dict, pages: dict):
+    print("\nSite pages:")
+    for source, origin in pages.items():
+        print(f"  {source}: {origin}")
+
+    for scenario, entries in results.items():
+        print(f"\n== {scenario}")
+        for entry, result in entries.items():
+            if entry == "state":
+                continue
+            line = f"  {entry:<16} {result['wall_seconds']:7.2f}s  {result['items']:4d} items  {result['items_per_second']:6.2f}/s"
+            before = baseline.get(scenario, {}).get(entry)
+            if before:
+                change = (result["wall_seconds"] - before["wall_seconds"]) / max(before["wall_seconds"], 1e-9) * 100
+                line += f"  ({change:+.1f}% wall vs baseline)"
+            print(line)
+            for name, stats in sorted(result["timers"].items()):
+                print(
+                    f"      {name:<28} n={stats['count']:<4} p50 {stats['p50'] * 1000:8.1f} ms  "
+                    f"p90 {stats['p90'] * 1000:8.1f} ms  p99 {stats['p99'] * 1000:8.1f} ms"
+                )
+        state = entries["state"]
+        print(f"  database: {state['tables']}, {state['published']} published, {state['uploads']} uploads")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", choices=["fixtures", "generated"], default="fixtures",
+                        help="serve the fixture pages (where present, see fake_sites.py) or generated pages")
+    parser.add_argument("--articles", type=int, default=20, help="articles per source for generated pages")
+    parser.add_argument("--site-latency", type=float, default=0.05, help="seconds per news site request")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="seconds per Supabase request")
+    parser.add_argument("--chat-latency", type=float, default=1.0, help="seconds per chat completion")
+    parser.add_argument("--image-latency", type=float, default=5.0, help="seconds per generated image")
+    parser.add_argument("--discovery", choices=["html", "feed"], default="html", help="how the scraper finds articles")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append", help="run only these scenarios")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra environment for every run")
+    parser.add_argument("--keep", action="store_true", help="keep the logs, metrics and caches of every run")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with the JSON results of an earlier run")
+    parser.add_argument("--driver", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.driver:
+        run_driver(*args.driver)
+        return
+
+    site_servers = {source: fake_sites.start(source, args.articles, args.site_latency, args.pages == "fixtures") for source in fake_sites.LAYOUTS}
+    sources = fake_sites.scraper_sources({source: url for source, (_, url) in site_servers.items()}, args.discovery)
+    _, _, supabase_url = fake_supabase.start(args.db_latency)
+    _, openai_url = fake_openai.start(args.chat_latency, args.image_latency)
+
+    base_env = {**os.environ, **DEFAULT_ENV}
+    base_env.update(dict(item.split("=", 1) for item in args.env))
+
+    results = {}
+    for scenario in args.scenario or list(SCENARIOS):
+        urllib.request.urlopen(urllib.request.Request(f"{supabase_url}/__reset", method="POST")).read()
+        # Kept when a run fails, so its log can be read
+        work_dir = Path(tempfile.mkdtemp(prefix=f"benchmark-{scenario}-"))
+        (work_dir / "images").mkdir()
+        env = {
+            **base_env,
+            "SUPABASE_URL": supabase_url,
+            "SUPABASE_SERVICE_KEY": "benchmark",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": openai_url,
+            # Fresh local caches, so every run starts cold
+            "SCRAPER_CACHE_DB": str(work_dir / "scraper_cache.sqlite3"),
+            "PROCESSOR_CACHE_DB": str(work_dir / "processor_cache.sqlite3"),
+        }
+        if scenario == "scripts":
+            # Leave the variants to the image processor, so it has work to measure
+            env.setdefault("IMAGE_PIPELINE_INLINE", "0")
+        if scenario == "batch":
+            env.setdefault("PROCESSOR_MODE", "batch")
+
+        results[scenario] = {}
+        for entry in SCENARIOS[scenario]:
+            print(f"Running {scenario}: {entry}...")
+            results[scenario][entry] = run_entry(entry, env, work_dir, sources)
+        if args.keep:
+            print(f"  Logs and metrics kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir)
+
+        with urllib.request.urlopen(f"{supabase_url}/__state") as response:
+            results[scenario]["state"] = json.loads(response.read())
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    pages = {
+        source: (fake_sites.fixture_origin(source) if args.pages == "fixtures" else None) or "generated"
+        for source in fake_sites.LAYOUTS
+    }
+    print_report(results, baseline, pages)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({**results, "pages": pages}, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
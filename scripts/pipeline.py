@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Pipeline Runner
+Runs the scraper, AI processor, image generator and image processor in one
+process. The stages are connected by in-memory queues and share one Supabase
+and one OpenAI client, so a scraped article flows straight into rewrite,
+image generation and variant upload.
+
+Every stage keeps its state in the database like the separate scripts do, so
+a crashed or timed-out run is picked up by the next one:
+- 'new' source articles (and expired leases) are claimed again by the rewrite stage
+- articles without image_standard are sent to image generation
+- PNGs spilled to afbeelding-generator/afbeeldingen are sent to variant upload
+"""
+
+import importlib.util
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+
+sys.path.insert(0, str(SCRIPT_DIR.resolve()))
+import pipeline_clients  # noqa: E402
+import pipeline_metrics as metrics  # noqa: E402
+import pipeline_workers  # noqa: E402
+
+# Workers per stage
+REWRITE_CONCURRENCY = int(os.getenv("PIPELINE_REWRITE_CONCURRENCY", "4"))
+IMAGE_CONCURRENCY = int(os.getenv("PIPELINE_IMAGE_CONCURRENCY", "3"))
+VARIANT_CONCURRENCY = int(os.getenv("PIPELINE_VARIANT_CONCURRENCY", "2"))
+
+# Total time budget (seconds). After it, no new work is taken; queued images are still published.
+TIME_BUDGET_SECONDS = float(os.getenv("PIPELINE_TIME_BUDGET", "1500"))
+
+# Backlog articles claimed at a time once scraping is done
+BACKLOG_BATCH_SIZE = int(os.getenv("PIPELINE_BACKLOG_BATCH_SIZE", "10"))
+
+
+def load_module(name: str, path: Path):
+    """
+    Import one of the stage scripts (their directories are not packages).
+    The module is registered in sys.modules under `name`; process pool workers load it
+    under the same name (see pipeline_workers), so its functions can be sent to them.
+    """
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+scraper = load_module("scraper", SCRIPT_DIR / "scraper" / "main.py")
+processor = load_module("processor", SCRIPT_DIR / "tekstverwerker" / "processor.py")
+generator = load_module("image_generator", SCRIPT_DIR / "afbeelding-generator" / "image_generator.py")
+image_processor = load_module("image_processor", SCRIPT_DIR / "afbeelding-processor" / "image_processor.py")
+generator._image_processor = image_processor
+
+
+def share_clients():
+    """Create the Supabase client all stages share (see pipeline_clients) before any stage runs."""
+    pipeline_clients.get_supabase()
+
+
+class Stage:
+    """A pool of worker threads reading from a queue and passing results downstream."""
+
+    def __init__(self, name: str, handler, workers: int, downstream: "Stage" = None):
+        self.name = name
+        self.handler = handler
+        self.downstream = downstream
+        self.queue = queue.Queue()
+        self.done = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self.run, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def pending(self) -> int:
+        return self.queue.qsize()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            started = time.perf_counter()
+            try:
+                result = self.handler(item)
+            except Exception as e:
+                print(f"  [{self.name}] Unexpected error: {e}")
+                result = None
+            metrics.observe(f"stage_{self.name}", time.perf_counter() - started, ok=bool(result))
+
+            with self.lock:
+                if result:
+                    self.done += 1
+                else:
+                    self.failed += 1
+            metrics.count(f"stage_{self.name}_{'done' if result else 'failed'}")
+            if result and self.downstream:
+                self.downstream.put(result)
+
+    def close(self):
+        """Wait until the queue is drained and all workers have stopped."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+deadline = 0.0
+
+
+def out_of_time() -> bool:
+    return time.monotonic() >= deadline
+
+
+def rewrite(article: dict):
+    """Rewrite a claimed source article; returns the saved articles row."""
+    if out_of_time():
+        # Hand the claim back so the next run picks it up right away
+        processor.update_source_status(article['id'], 'new')
+        return None
+    return processor.process_article(article)
+
+
+def generate(article: dict):
+    """Generate the thumbnail of an article; returns the job for the variant stage."""
+    if out_of_time():
+        # The article keeps image_standard null and is picked up by the next run
+        return None
+    label = article['title'][:40]
+    print(f"  [{label}] Calling OpenAI Image API...")
+    image_bytes = generator.decode_image(generator.generate_thumbnail(article['title'], article['summary']))
+    return {"id": article['id'], "label": label, "source": image_bytes}
+
+
+def publish(job: dict, executor: ProcessPoolExecutor) -> bool:
+    """Create, upload and link the variants of one image; spill new images to disk on failure."""
+    try:
+        variants = image_processor.process_image(job["source"], name_prefix=job["id"], executor=executor)
+        if image_processor.publish_article_images(job["id"], variants):
+            print(f"  [{job['label']}] Published image variants")
+            if job.get("png_path"):
+                image_processor.cleanup_files(job["png_path"])
+            return True
+    except Exception as e:
+        print(f"  [{job['label']}] Error creating variants: {e}")
+
+    if job.get("png_path"):
+        # Already on disk; the next run retries it
+        return False
+
+    print(f"  [{job['label']}] Spilling PNG to disk")
+    filename = generator.save_image(job["source"], job["id"])
+    generator.update_article_image(job["id"], filename)
+    return False
+
+
+def seed_images(images: Stage, variants: Stage):
+    """Queue the image work left behind by earlier runs."""
+    # PNGs that were generated but never published
+    png_files = image_processor.get_png_files()
+    for png_path, article_id in image_processor.get_article_ids_for_images(png_files).items():
+        variants.put({"id": article_id, "label": png_path.name, "source": png_path, "png_path": png_path})
+
+    # Articles that never got an image
+    last_id = ""
+    while not out_of_time():
+        articles = generator.get_articles_without_image(generator.BATCH_SIZE, after_id=last_id)
+        if not articles:
+            break
+        last_id = max(article['id'] for article in articles)
+        for article in articles:
+            images.put(article)
+
+
+def drain_backlog(rewrites: Stage):
+    """Claim leftover 'new' source articles while the rewrite stage has room."""
+    while not out_of_time():
+        if rewrites.pending() >= REWRITE_CONCURRENCY:
+            time.sleep(0.5)
+            continue
+        articles = processor.claim_pending_articles(BACKLOG_BATCH_SIZE)
+        if not articles:
+            return
+        for article in articles:
+            rewrites.put(article)
+
+
+def main():
+    """Main pipeline function."""
+    global deadline
+    deadline = time.monotonic() + TIME_BUDGET_SECONDS
+    metrics.init("pipeline")
+
+    print("Starting News Pipeline...")
+    print(f"Worker: {processor.WORKER_ID}")
+    print(
+        f"Concurrency: rewrite {REWRITE_CONCURRENCY}, images {IMAGE_CONCURRENCY}, "
+        f"variants {VARIANT_CONCURRENCY}; time budget: {TIME_BUDGET_SECONDS:.0f}s"
+    )
+    share_clients()
+    generator.ensure_images_directory()
+
+    # Create the process pools before any stage thread runs. Their workers come
+    # from a fork server, so this process is never forked while threads hold locks.
+    # The extraction pool goes first: it adds trafilatura to the fork server's preload.
+    workers = max(1, min(image_processor.IMAGE_WORKERS, image_processor.MAX_IN_FLIGHT_IMAGES))
+    extract_pool = scraper.extraction_pool()
+    with pipeline_workers.process_pool(workers, image_processor.__name__, image_processor.__file__) as executor:
+        variants = Stage("variants", lambda job: publish(job, executor), VARIANT_CONCURRENCY)
+        images = Stage("images", generate, IMAGE_CONCURRENCY, downstream=variants)
+        rewrites = Stage("rewrite", rewrite, REWRITE_CONCURRENCY, downstream=images)
+        for stage in (variants, images, rewrites):
+            stage.start()
+
+        scraped = 0
+        try:
+            # Resume from database state before new articles come in, so nothing is queued twice
+            seed_images(images, variants)
+
+            def on_saved(rows: list):
+                try:
+                    claimed = processor.claim_articles([row['id'] for row in rows])
+                except Exception as e:
+                    # The rows stay 'new'; drain_backlog() or the next run claims them
+                    print(f"  Error claiming scraped articles: {e}")
+                    return
+                for article in claimed:
+                    rewrites.put(article)
+
+            print("\nScraping sources...")
+            try:
+                scraped = scraper.scrape_sources(on_saved=on_saved, extract_pool=extract_pool)
+                print(f"\nScraping complete. Saved {scraped} new articles total.")
+            except Exception as e:
+                print(f"\nScraping failed, continuing with the backlog: {e}")
+
+            drain_backlog(rewrites)
+        finally:
+            if extract_pool:
+                extract_pool.shutdown()
+            # Close the stages in order so every result reaches the next stage; also
+            # after an error, so claimed articles and paid images are not dropped
+            rewrites.close()
+            images.close()
+            variants.close()
+
+    print("\nPipeline complete!")
+    print(f"  Scraped: {scraped}")
+    print(f"  Rewritten: {rewrites.done} ({rewrites.failed} skipped or failed)")
+    print(f"  Images generated: {images.done} ({images.failed} skipped or failed)")
+    print(f"  Images published: {variants.done} ({variants.failed} failed or spilled to disk)")
+    token_usage = processor.token_usage
+    print(
+        f"  Token usage: {token_usage['prompt_tokens']} in "
+        f"({token_usage['cached_tokens']} cached), {token_usage['completion_tokens']} out "
+        f"over {token_usage['requests']} requests"
+    )
+
+
+if __name__ == "__main__":
+    main()
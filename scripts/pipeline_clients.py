@@ -0,0 +1,114 @@
+"""
+Pipeline Clients
+Supabase, OpenAI and PostgREST helpers shared by the pipeline scripts.
+Only uses the standard library at import time; the supabase and openai
+packages are imported on first use, so a run without work never loads them.
+
+    from pipeline_clients import RateLimiter, get_openai_client, get_supabase, has_rows
+
+    call_with_rate_limit = RateLimiter(MAX_RATE_LIMIT_RETRIES).call
+    response = call_with_rate_limit(get_openai_client().images.generate, ...)
+"""
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+# One client of each per process, shared by every script loaded in it
+supabase = None
+openai_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase():
+    """Return the Supabase client, creating it on first use."""
+    global supabase
+    if supabase is None:
+        with _client_lock:
+            if supabase is None:
+                from supabase import create_client
+                supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_SERVICE_KEY"))
+    return supabase
+
+
+def get_openai_client():
+    """Return the OpenAI client, creating it on first use."""
+    global openai_client
+    if openai_client is None:
+        with _client_lock:
+            if openai_client is None:
+                from openai import OpenAI
+                # Retries are handled by RateLimiter, so all workers back off together on a 429
+                openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return openai_client
+
+
+def has_rows(table: str, filters: dict) -> bool:
+    """
+    Cheap "is there work?" check: ask PostgREST for one matching id with plain urllib,
+    before the Supabase and OpenAI clients are imported. Returns True if the check fails.
+    """
+    supabase_url = os.getenv("SUPABASE_URL") or ""
+    service_key = os.getenv("SUPABASE_SERVICE_KEY") or ""
+    query = urlencode({"select": "id", "limit": "1", **filters})
+    request = Request(
+        f"{supabase_url.rstrip('/')}/rest/v1/{table}?{query}",
+        headers={"apikey": service_key, "Authorization": f"Bearer {service_key}"},
+    )
+    try:
+        with urlopen(request, timeout=10) as response:
+            return bool(json.loads(response.read()))
+    except Exception as e:
+        print(f"Work check failed, continuing: {e}")
+        return True
+
+
+class RateLimiter:
+    """
+    Retries OpenAI calls for one script. A 429 pauses every worker using this
+    limiter for the Retry-After time; timeouts, connection errors and 5xx
+    responses are retried with exponential backoff by the failing call only.
+    """
+
+    def __init__(self, max_retries: int):
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def call(self, fn, *args, **kwargs):
+        """Call an OpenAI function with retries."""
+        from openai import APIConnectionError, InternalServerError, RateLimitError
+
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            try:
+                return fn(*args, **kwargs)
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+
+                headers = e.response.headers if e.response is not None else {}
+                if headers.get("retry-after-ms"):
+                    delay = float(headers["retry-after-ms"]) / 1000
+                elif headers.get("retry-after", "").replace(".", "", 1).isdigit():
+                    delay = float(headers["retry-after"])
+                else:
+                    delay = 2 ** attempt
+
+                print(f"  Rate limited, pausing all workers for {delay:.1f}s")
+                with self._lock:
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            except (APIConnectionError, InternalServerError) as e:
+                # APIConnectionError includes timeouts; only this call waits
+                if attempt == self.max_retries:
+                    raise
+                delay = min(2 ** attempt, 30)
+                print(f"  OpenAI request failed ({e.__class__.__name__}), retrying in {delay}s")
+                time.sleep(delay)
@@ -0,0 +1,217 @@
+"""
+Pipeline Metrics
+Shared timers, counters and histograms for the pipeline scripts. Only uses the
+standard library, so importing it does not slow down startup.
+
+    import pipeline_metrics as metrics
+
+    @metrics.timed()
+    def get_article_links(source): ...
+
+    metrics.count("scraper_articles_saved", len(saved))
+    metrics.count("scraper_download_bytes", len(html))
+
+Configuration (environment variables):
+    METRICS_JSONL  append every timed call and a summary per run to this JSON lines file
+    METRICS_PORT   serve the metrics in Prometheus text format on http://0.0.0.0:PORT/metrics
+"""
+
+import atexit
+import functools
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_JSONL = os.getenv("METRICS_JSONL")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Histogram buckets (seconds) for the Prometheus export
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_counters = {}
+_timers = {}
+_script = None
+_jsonl_file = None
+
+
+def init(script: str):
+    """Start collecting for a script run: open the exports and report on exit."""
+    global _script
+    with _lock:
+        if _script is not None:
+            return
+        _script = script
+
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    atexit.register(report)
+
+
+def count(name: str, value: int = 1):
+    """Add `value` to a counter."""
+    if not value:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, seconds: float, ok: bool = True):
+    """Record one timed call."""
+    with _lock:
+        _timers.setdefault(name, []).append(seconds)
+    write_event({"type": "timer", "name": name, "seconds": round(seconds, 6), "ok": ok})
+
+
+@contextmanager
+def timer(name: str):
+    """Time the body of a `with` block."""
+    started = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observe(name, time.perf_counter() - started, ok)
+
+
+def timed(name: str = None):
+    """Decorator that times every call of a function (named after the function by default)."""
+    def decorator(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def measure(fn, *args, **kwargs) -> tuple:
+    """
+    Call fn and return (result, seconds). Submit this to a process pool and
+    observe() the seconds in the parent, since a worker's metrics stay in the worker.
+    """
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of a list of numbers (0 <= q <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def snapshot() -> dict:
+    """Current counters and per-timer count, total, p50, p90, p99 and max (seconds)."""
+    with _lock:
+        counters = dict(_counters)
+        timers = {name: list(values) for name, values in _timers.items()}
+
+    return {
+        "counters": counters,
+        "timers": {
+            name: {
+                "count": len(values),
+                "total": round(sum(values), 6),
+                "p50": round(percentile(values, 50), 6),
+                "p90": round(percentile(values, 90), 6),
+                "p99": round(percentile(values, 99), 6),
+                "max": round(max(values), 6),
+            }
+            for name, values in timers.items()
+        },
+    }
+
+
+def write_event(event: dict):
+    """Append one event to METRICS_JSONL (if configured)."""
+    global _jsonl_file
+    if not METRICS_JSONL:
+        return
+
+    line = json.dumps({"ts": round(time.time(), 3), "script": _script, "pid": os.getpid(), **event})
+    with _lock:
+        if _jsonl_file is None:
+            _jsonl_file = open(METRICS_JSONL, "a", encoding="utf-8")
+        _jsonl_file.write(line + "\n")
+        _jsonl_file.flush()
+
+
+def report():
+    """Print a summary of this run and append it to METRICS_JSONL."""
+    data = snapshot()
+    if not data["counters"] and not data["timers"]:
+        return
+
+    write_event({"type": "summary", **data})
+
+    print("\nMetrics:")
+    for name, stats in sorted(data["timers"].items()):
+        print(
+            f"  {name}: {stats['count']} calls, {stats['total']:.2f}s total, "
+            f"p50 {stats['p50']:.3f}s, p90 {stats['p90']:.3f}s, max {stats['max']:.3f}s"
+        )
+    for name, value in sorted(data["counters"].items()):
+        print(f"  {name}: {value}")
+
+
+def metric_name(name: str) -> str:
+    return "pipeline_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def render_prometheus() -> str:
+    """The current metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        timers = {name: list(values) for name, values in _timers.items()}
+
+    lines = []
+    for name, value in sorted(counters.items()):
+        metric = metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+
+    for name, values in sorted(timers.items()):
+        metric = metric_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for bucket in BUCKETS:
+            lines.append(f'{metric}_bucket{{le="{bucket}"}} {sum(1 for value in values if value <= bucket)}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {len(values)}')
+        lines.append(f"{metric}_sum {sum(values)}")
+        lines.append(f"{metric}_count {len(values)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port: int):
+    """Serve render_prometheus() on /metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"Serving metrics on http://0.0.0.0:{port}/metrics")
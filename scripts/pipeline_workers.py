@@ -0,0 +1,60 @@
+"""
+Pipeline Workers
+Process pools for the CPU-bound parts of the pipeline scripts (article
+extraction, image variant encoding).
+
+    import pipeline_workers
+
+    pool = pipeline_workers.process_pool(4, __name__, __file__, preload=["trafilatura"])
+    pool.submit(extract_article_content, html, url, source_name)
+
+Workers are started by a fork server (or spawned where there is none), never
+by forking the calling process: the scripts run threads, and a child forked
+while another thread holds a lock can deadlock. That also means workers do not
+inherit the caller's modules, so two things are arranged here:
+- the scripts live in directories that are not packages and are loaded from
+  their path, so load_script() loads the script in every worker before it takes
+  tasks; otherwise its functions cannot be unpickled there
+- heavy imports in `preload` are done once by the fork server, and every worker
+  forked from it starts with them already imported
+"""
+
+import importlib.util
+import multiprocessing
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules the fork server imports once; "__main__" is the script that was started
+_preload = {"__main__"}
+
+
+def load_script(name: str, path: str):
+    """Pool initializer: import a script from its path under `name`, unless it is already loaded."""
+    if name == "__main__" or name in sys.modules:
+        # The main script is imported by multiprocessing itself
+        return
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+
+def process_pool(max_workers: int, module_name: str, module_path: str, preload: list = ()) -> ProcessPoolExecutor:
+    """
+    A process pool whose workers can run the functions of the script `module_name`
+    (its __name__) at `module_path` (its __file__).
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Only takes effect if the fork server is not running yet; workers import the rest on demand
+        _preload.update(preload)
+        context.set_forkserver_preload(sorted(_preload))
+    else:
+        context = multiprocessing.get_context("spawn")
+
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=context,
+        initializer=load_script,
+        initargs=(module_name, str(module_path)),
+    )
@@ -4,98 +4,690 @@ Multi-Source News Scraper
 Scrapes tech news articles from multiple sources and stores them in Supabase.
 """
 
+import email.utils
+import functools
+import hashlib
+import io
 import os
 import re
+import sqlite3
+import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timezone
+from html import escape
+from pathlib import Path
 from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
 import requests
-from bs4 import BeautifulSoup
-from supabase import create_client, Client
-import trafilatura
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+# Shared instrumentation, clients and process pools (scripts/pipeline_metrics.py,
+# scripts/pipeline_clients.py, scripts/pipeline_workers.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import pipeline_metrics as metrics  # noqa: E402
+import pipeline_workers  # noqa: E402
+from pipeline_clients import get_supabase  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-
 # =============================================================================
 # CONFIGURATIE: Voeg hier nieuwe bronnen toe
+#
+# discovery: hoe artikelen worden gevonden
+#   "html"    - indexpagina "url" doorzoeken met link_pattern (standaard)
+#   "feed"    - RSS/Atom-feed "feed_url"
+#   "sitemap" - (news) sitemap "sitemap_url"
+# Lukt een feed of sitemap niet, dan wordt de indexpagina "url" gebruikt.
 # =============================================================================
 SOURCES = [
     {
         "name": "nos",
         "url": "https://nos.nl/nieuws/tech",
+        "discovery": "html",
+        # Nog niet tegen de live site gecontroleerd; zet "discovery" pas op "feed" als de feed werkt
+        "feed_url": "https://feeds.nos.nl/nosnieuwstech",
         "link_pattern": "/artikel/",
         "base_url": "https://nos.nl",
     },
     {
         "name": "guardian",
         "url": "https://www.theguardian.com/uk/technology",
+        "discovery": "html",
+        # Nog niet tegen de live site gecontroleerd; zet "discovery" pas op "feed" als de feed werkt
+        "feed_url": "https://www.theguardian.com/uk/technology/rss",
         "link_pattern": r"/technology/\d{4}/",  # Alleen artikelen met jaar (geen topic pagina's)
         "base_url": "https://www.theguardian.com",
     },
 ]
+
+# Rate limiting per host (token bucket): gemiddeld aantal requests per seconde
+# en het aantal requests dat direct achter elkaar mag (burst)
+HOST_RATE_PER_SECOND = float(os.getenv("SCRAPER_HOST_RATE", "0.5"))
+HOST_BURST = int(os.getenv("SCRAPER_HOST_BURST", "1"))
+
+# Maximaal aantal gelijktijdige downloads over alle bronnen heen
+MAX_WORKERS = int(os.getenv("SCRAPER_MAX_WORKERS", "8"))
+
+# HTTP client: keep-alive pool per host, timeouts (connect, read) en retries
+HTTP_POOL_SIZE = int(os.getenv("SCRAPER_HTTP_POOL_SIZE", str(MAX_WORKERS)))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("SCRAPER_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("SCRAPER_HTTP_READ_TIMEOUT", "30"))
+HTTP_RETRIES = int(os.getenv("SCRAPER_HTTP_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("SCRAPER_HTTP_BACKOFF", "1.0"))
+
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
+}
+
+# Lokale cache met ETag/Last-Modified en content hash van de bronpagina's
+SCRIPT_DIR = Path(__file__).parent
+CACHE_DB_PATH = Path(os.getenv("SCRAPER_CACHE_DB", str(SCRIPT_DIR / "scraper_cache.sqlite3")))
+
+# Aantal URLs per membership-query naar de database (houdt de request-URL kort)
+DEDUP_CHUNK_SIZE = int(os.getenv("SCRAPER_DEDUP_CHUNK_SIZE", "50"))
+
+# Aantal processen voor trafilatura-extractie (CPU-bound); 1 = in de download-threads
+EXTRACT_PROCESSES = int(os.getenv("SCRAPER_EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+
+# HTML parser voor het vinden van artikel-links: "lxml", "selectolax" of "bs4"
+LINK_PARSER = os.getenv("SCRAPER_LINK_PARSER", "lxml")
+
+# Query parameters die alleen tracking zijn en uit URLs worden verwijderd
+TRACKING_PARAMS = {"cmp", "fbclid", "gclid", "mc_cid", "mc_eid", "at_medium", "at_campaign"}
+
+# Aantal artikelen per multi-row insert naar article_websites
+INSERT_BATCH_SIZE = int(os.getenv("SCRAPER_INSERT_BATCH_SIZE", "20"))
+
+# Feed-items met minstens zoveel tekens HTML gelden als volledige tekst en gaan
+# direct naar de extractie, zonder het artikel zelf te downloaden
+FEED_FULLTEXT_MIN_CHARS = int(os.getenv("SCRAPER_FEED_FULLTEXT_MIN_CHARS", "1500"))
+
+# Maximaal aantal child-sitemaps dat per run uit een sitemap index wordt gelezen
+SITEMAP_MAX_CHILDREN = int(os.getenv("SCRAPER_SITEMAP_MAX_CHILDREN", "3"))
 # =============================================================================
 
 
-def get_existing_urls() -> set:
-    """Fetch all existing URLs from the database."""
-    response = supabase.table("article_websites").select("url").execute()
-    return {item["url"] for item in response.data}
+class TokenBucket:
+    """Thread-safe token bucket that paces requests to a single host."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Consume a token and return 0 if one is available, else return the seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+_host_buckets = {}
+_host_buckets_lock = threading.Lock()
+
+
+def get_host_bucket(host: str) -> TokenBucket:
+    """Return the rate limit of a host (netloc), creating it on first use."""
+    with _host_buckets_lock:
+        bucket = _host_buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(HOST_RATE_PER_SECOND, HOST_BURST)
+            _host_buckets[host] = bucket
+    return bucket
+
+
+def wait_for_host(url: str):
+    """Wait until the rate limit for the host of this URL allows a request."""
+    get_host_bucket(urlparse(url).netloc).acquire()
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Return the shared keep-alive HTTP session used for all downloads."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            retry = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=HTTP_BACKOFF_FACTOR,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                respect_retry_after_header=True,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=max(len(SOURCES), 1),
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HTTP_HEADERS)
+
+            # urllib3 decodes brotli transparently when the brotli package is installed
+            encodings = ["gzip", "deflate"]
+            try:
+                import brotli  # noqa: F401
+                encodings.append("br")
+            except ImportError:
+                pass
+            session.headers["Accept-Encoding"] = ", ".join(encodings)
+
+            _http_session = session
+    return _http_session
+
+
+def http_get(url: str, paced: bool = False) -> requests.Response:
+    """
+    GET a URL through the shared session, respecting the per-host rate limit.
+    Pass `paced` when the caller already took the host's token.
+    """
+    if not paced:
+        wait_for_host(url)
+    response = get_http_session().get(url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    response.raise_for_status()
+    return response
+
+
+_cache_db = None
+_cache_db_lock = threading.Lock()
+
+
+def get_cache_db() -> sqlite3.Connection:
+    """Open (and create if needed) the local SQLite cache shared by all threads."""
+    global _cache_db
+    if _cache_db is None:
+        _cache_db = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+        _cache_db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS http_validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                updated_at REAL
+            )
+            """
+        )
+        _cache_db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS discovery_watermarks (
+                source TEXT PRIMARY KEY,
+                last_seen REAL
+            )
+            """
+        )
+        _cache_db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS unextractable_urls (
+                url TEXT PRIMARY KEY,
+                failed_at REAL
+            )
+            """
+        )
+        _cache_db.commit()
+    return _cache_db
+
+
+def get_cached_validators(url: str) -> Optional[tuple]:
+    """Return (etag, last_modified, content_hash) stored for a URL, if any."""
+    with _cache_db_lock:
+        return get_cache_db().execute(
+            "SELECT etag, last_modified, content_hash FROM http_validators WHERE url = ?",
+            (url,),
+        ).fetchone()
+
+
+def store_cached_validators(url: str, etag: Optional[str], last_modified: Optional[str], content_hash: str):
+    """Remember the validators and content hash of the latest response for a URL."""
+    with _cache_db_lock:
+        db = get_cache_db()
+        db.execute(
+            "INSERT OR REPLACE INTO http_validators VALUES (?, ?, ?, ?, ?)",
+            (url, etag, last_modified, content_hash, time.time()),
+        )
+        db.commit()
+
+
+def get_watermark(source_name: str) -> Optional[float]:
+    """Publication time (Unix timestamp) of the newest feed or sitemap item seen for a source."""
+    with _cache_db_lock:
+        row = get_cache_db().execute(
+            "SELECT last_seen FROM discovery_watermarks WHERE source = ?", (source_name,)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def store_watermark(source_name: str, last_seen: float):
+    """Remember the newest publication time seen for a source."""
+    with _cache_db_lock:
+        db = get_cache_db()
+        db.execute("INSERT OR REPLACE INTO discovery_watermarks VALUES (?, ?)", (source_name, last_seen))
+        db.commit()
+
+
+def get_unextractable_urls(urls: list) -> set:
+    """Return which of the given URLs could not be extracted in an earlier run."""
+    found = set()
+    with _cache_db_lock:
+        db = get_cache_db()
+        for i in range(0, len(urls), DEDUP_CHUNK_SIZE):
+            chunk = urls[i:i + DEDUP_CHUNK_SIZE]
+            rows = db.execute(
+                f"SELECT url FROM unextractable_urls WHERE url IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update(row[0] for row in rows)
+    return found
+
+
+def store_unextractable_url(url: str):
+    """Remember a page trafilatura found no article in (video, liveblog), so it is not downloaded again."""
+    with _cache_db_lock:
+        db = get_cache_db()
+        db.execute("INSERT OR REPLACE INTO unextractable_urls VALUES (?, ?)", (url, time.time()))
+        db.commit()
+
+
+def fetch_if_changed(url: str) -> tuple:
+    """
+    Conditionally GET a URL using the cached ETag/Last-Modified.
+    Returns (response, validators), or (None, None) when the server answers 304
+    or the body hash is unchanged. The validators are not stored here: pass them
+    to store_cached_validators() once the articles found on the page are saved,
+    otherwise a failed run would skip those articles until the page changes.
+    """
+    cached = get_cached_validators(url)
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    wait_for_host(url)
+    response = get_http_session().get(
+        url, headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    )
+    if response.status_code == 304:
+        return None, None
+    response.raise_for_status()
+
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    if cached and cached[2] == content_hash:
+        return None, None
+
+    validators = (url, response.headers.get("ETag"), response.headers.get("Last-Modified"), content_hash)
+    return response, validators
+
+
+def get_existing_urls(urls: list) -> set:
+    """Return which of the given candidate URLs already exist in the database."""
+    existing = set()
+    for i in range(0, len(urls), DEDUP_CHUNK_SIZE):
+        chunk = urls[i:i + DEDUP_CHUNK_SIZE]
+        response = get_supabase().table("article_websites").select("url").in_("url", chunk).execute()
+        existing.update(item["url"] for item in response.data)
+    return existing
+
+
+@functools.lru_cache(maxsize=None)
+def compile_link_pattern(pattern: str) -> re.Pattern:
+    """Compile a source link_pattern once and reuse it for every link."""
+    return re.compile(pattern)
+
+
+def normalize_url(href: str, base_url: str) -> Optional[str]:
+    """Resolve a link against the source and strip fragments and tracking parameters."""
+    parsed = urlparse(urljoin(base_url, href.strip()))
+    if parsed.scheme not in ("http", "https"):
+        return None
+
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")
+    ]
+    return urlunparse(parsed._replace(query=urlencode(query), fragment=""))
+
+
+def iter_hrefs(html: bytes):
+    """Yield the href of every <a> tag, using the configured LINK_PARSER."""
+    if LINK_PARSER == "selectolax":
+        from selectolax.parser import HTMLParser
+
+        for node in HTMLParser(html).css("a[href]"):
+            yield node.attributes.get("href") or ""
+    elif LINK_PARSER == "bs4":
+        from bs4 import BeautifulSoup
+
+        for a_tag in BeautifulSoup(html, "html.parser").find_all("a", href=True):
+            yield a_tag["href"]
+    else:
+        import lxml.html
 
+        for href in lxml.html.fromstring(html).xpath("//a/@href"):
+            yield str(href)
 
-def get_article_links(source: dict) -> list:
-    """Scrape a source page for article links."""
+
+@metrics.timed()
+def get_article_links(source: dict) -> tuple:
+    """Scrape a source page for article links. Returns (links, validators to store once they are saved)."""
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-        }
-        response = requests.get(source["url"], headers=headers, timeout=30)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        response, validators = fetch_if_changed(source["url"])
+        if response is None:
+            print(f"  [{source['name'].upper()}] Page not modified, skipping")
+            metrics.count("scraper_index_not_modified")
+            return [], []
 
-        links = []
-        for a_tag in soup.find_all("a", href=True):
-            href = a_tag["href"]
+        pattern = compile_link_pattern(source["link_pattern"])
 
+        # Order-preserving dedup of matching, normalized links
+        links = {}
+        for href in iter_hrefs(response.content):
             # Check if link matches the pattern for this source (supports regex)
-            if re.search(source["link_pattern"], href):
-                # Build full URL
-                if href.startswith("http"):
-                    full_url = href
-                else:
-                    full_url = f"{source['base_url']}{href}"
+            if pattern.search(href):
+                full_url = normalize_url(href, source["base_url"])
+                if full_url:
+                    links[full_url] = None
+        links = list(links)
+
+        print(f"  [{source['name'].upper()}] Found {len(links)} article links")
+        return links, [validators]
+    except Exception as e:
+        print(f"  [{source['name'].upper()}] Error fetching page: {e}")
+        metrics.count("scraper_index_errors")
+        return [], []
 
-                # Avoid duplicates in this batch
-                if full_url not in links:
-                    links.append(full_url)
 
-        print(f"  Found {len(links)} article links")
-        return links
-    except Exception as e:
-        print(f"  Error fetching page: {e}")
-        return []
+def local_name(tag: str) -> str:
+    """XML tag name without its namespace."""
+    return tag.rsplit("}", 1)[-1]
 
 
-def extract_article_content(url: str, source_name: str) -> Optional[dict]:
-    """Extract title and content from an article URL using trafilatura."""
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Parse an RFC 822 (RSS) or ISO 8601 (Atom, sitemaps) date to a Unix timestamp."""
+    if not value or not value.strip():
+        return None
+    value = value.strip()
     try:
-        downloaded = trafilatura.fetch_url(url)
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def inner_xhtml(elem) -> str:
+    """The markup inside an Atom type="xhtml" element, without the XML namespaces."""
+    from xml.etree.ElementTree import tostring
+
+    for node in elem.iter():
+        node.tag = local_name(node.tag)
+        node.attrib = {local_name(key): value for key, value in node.attrib.items()}
+    # Children are serialized with their tails, so text between them is kept
+    return (elem.text or "") + "".join(tostring(child, encoding="unicode") for child in elem)
+
+
+def iter_feed_items(xml: bytes):
+    """
+    Stream the items of an RSS or Atom feed. Yields dicts with url, title,
+    published (timestamp) and content: the full-text HTML (content:encoded or
+    Atom content), or else the description.
+    """
+    from xml.etree.ElementTree import iterparse
+
+    for _, elem in iterparse(io.BytesIO(xml), events=("end",)):
+        if local_name(elem.tag) not in ("item", "entry"):
+            continue
+
+        item = {"url": None, "title": None, "published": None, "content": None}
+        description = None
+        for child in elem:
+            field = local_name(child.tag)
+            text = (child.text or "").strip()
+            if field == "link":
+                # RSS: <link>url</link>, Atom: <link rel="alternate" href="url"/>
+                href = child.get("href")
+                if href is None:
+                    item["url"] = item["url"] or text
+                elif child.get("rel", "alternate") == "alternate":
+                    item["url"] = href
+            elif field == "title":
+                item["title"] = text
+            elif field in ("pubDate", "published", "updated", "date"):
+                item["published"] = item["published"] or parse_timestamp(text)
+            elif field in ("encoded", "content", "description", "summary"):
+                if child.get("type") == "xhtml":
+                    # Atom inline XHTML: the content is markup, not text
+                    text = inner_xhtml(child).strip()
+                if field in ("encoded", "content"):
+                    item["content"] = text or None
+                else:
+                    description = text or None
+
+        item["content"] = item["content"] or description
+        if item["url"]:
+            yield item
+        # Drop the parsed item, so memory use does not grow with the feed
+        elem.clear()
+
+
+def iter_sitemap_entries(xml: bytes):
+    """
+    Stream the entries of a sitemap, news sitemap or sitemap index. Yields dicts
+    with type ("url" or "sitemap"), url, title and published (timestamp).
+    """
+    from xml.etree.ElementTree import iterparse
+
+    for _, elem in iterparse(io.BytesIO(xml), events=("end",)):
+        kind = local_name(elem.tag)
+        if kind not in ("url", "sitemap"):
+            continue
+
+        entry = {"type": kind, "url": None, "title": None, "published": None, "content": None}
+        for child in elem:
+            field = local_name(child.tag)
+            if field == "loc":
+                entry["url"] = (child.text or "").strip()
+            elif field == "lastmod":
+                entry["published"] = entry["published"] or parse_timestamp(child.text)
+            elif field == "news":
+                # <news:news> has the publication date and title of a news sitemap entry
+                for news_field in child.iter():
+                    if local_name(news_field.tag) == "publication_date":
+                        entry["published"] = parse_timestamp(news_field.text) or entry["published"]
+                    elif local_name(news_field.tag) == "title":
+                        entry["title"] = (news_field.text or "").strip()
+
+        if entry["url"]:
+            yield entry
+        elem.clear()
+
+
+def get_index_items(source: dict) -> tuple:
+    """Discovery backend "html": the article links on the source's index page."""
+    links, validators = get_article_links(source)
+    items = [{"url": url, "title": None, "published": None, "content": None} for url in links]
+    return items, validators
+
+
+@metrics.timed()
+def get_feed_items(source: dict) -> tuple:
+    """Discovery backend "feed": the items of the source's RSS or Atom feed."""
+    response, validators = fetch_if_changed(source["feed_url"])
+    if response is None:
+        print(f"  [{source['name'].upper()}] Feed not modified, skipping")
+        metrics.count("scraper_index_not_modified")
+        return [], []
+
+    items = list(iter_feed_items(response.content))
+    print(f"  [{source['name'].upper()}] Found {len(items)} feed items")
+    return items, [validators]
+
+
+@metrics.timed()
+def get_sitemap_items(source: dict) -> tuple:
+    """
+    Discovery backend "sitemap": the URLs of the source's (news) sitemap. For a
+    sitemap index, the newest child sitemaps changed since the watermark are read.
+    """
+    response, validators = fetch_if_changed(source["sitemap_url"])
+    if response is None:
+        print(f"  [{source['name'].upper()}] Sitemap not modified, skipping")
+        metrics.count("scraper_index_not_modified")
+        return [], []
+    validators = [validators]
+
+    entries = list(iter_sitemap_entries(response.content))
+    items = [entry for entry in entries if entry["type"] == "url"]
+
+    watermark = get_watermark(source["name"])
+    children = [
+        entry for entry in entries
+        if entry["type"] == "sitemap" and (watermark is None or (entry["published"] or watermark) >= watermark)
+    ]
+    children.sort(key=lambda entry: entry["published"] or 0, reverse=True)
+    for child in children[:SITEMAP_MAX_CHILDREN]:
+        child_response, child_validators = fetch_if_changed(child["url"])
+        if child_response is not None:
+            items.extend(entry for entry in iter_sitemap_entries(child_response.content) if entry["type"] == "url")
+            validators.append(child_validators)
+
+    print(f"  [{source['name'].upper()}] Found {len(items)} sitemap entries")
+    return items, validators
+
+
+DISCOVERY_BACKENDS = {
+    "html": get_index_items,
+    "feed": get_feed_items,
+    "sitemap": get_sitemap_items,
+}
+
+
+def discover_articles(source: dict) -> tuple:
+    """
+    Find the articles of a source with its discovery backend. Returns (items, checkpoint):
+    the items published since the source's watermark (undated items always count), and
+    the newest publication time seen plus the HTTP validators of the pages read, to
+    store with store_checkpoint() once the items are saved.
+    """
+    discovery = source.get("discovery", "html")
+    try:
+        items, validators = DISCOVERY_BACKENDS[discovery](source)
+    except Exception as e:
+        if discovery == "html" or not source.get("url"):
+            print(f"  [{source['name'].upper()}] Error reading {discovery}: {e}")
+            metrics.count("scraper_index_errors")
+            return [], {"watermark": None, "validators": []}
+        print(f"  [{source['name'].upper()}] Error reading {discovery}, using the index page: {e}")
+        metrics.count("scraper_discovery_fallbacks")
+        items, validators = get_index_items(source)
+
+    pattern = compile_link_pattern(source["link_pattern"]) if source.get("link_pattern") else None
+    watermark = get_watermark(source["name"])
+    newest = watermark
+    found = {}
+    for item in items:
+        url = normalize_url(item["url"], source.get("base_url") or item["url"])
+        if not url or (pattern and not pattern.search(url)):
+            continue
+
+        published = item["published"]
+        if published is not None:
+            newest = published if newest is None else max(newest, published)
+            if watermark is not None and published < watermark:
+                metrics.count("scraper_articles_below_watermark")
+                continue
+        found[url] = {**item, "url": url}
+
+    return list(found.values()), {"watermark": newest, "validators": validators}
+
+
+def store_checkpoint(source_name: str, checkpoint: dict):
+    """Remember the validators and watermark of a source whose new articles are all saved."""
+    for validators in checkpoint["validators"]:
+        store_cached_validators(*validators)
+    if checkpoint["watermark"] is not None:
+        store_watermark(source_name, checkpoint["watermark"])
+
+
+def feed_item_html(item: dict) -> bytes:
+    """Wrap the full text of a feed item in a minimal page for extract_article_content()."""
+    title = escape(item["title"] or "")
+    return (
+        f"<html><head><title>{title}</title></head>"
+        f"<body><article><h1>{title}</h1>{item['content']}</article></body></html>"
+    ).encode("utf-8")
+
+
+def download_article(url: str, paced: bool = False) -> Optional[bytes]:
+    """Download the raw HTML of an article (`paced`: see http_get)."""
+    try:
+        downloaded = http_get(url, paced).content
         if not downloaded:
             print(f"  Could not download: {url}")
+            metrics.count("scraper_articles_errored")
             return None
+        metrics.count("scraper_download_bytes", len(downloaded))
+        return downloaded
+    except Exception as e:
+        print(f"  Error downloading {url}: {e}")
+        metrics.count("scraper_articles_errored")
+        return None
 
-        # Extract metadata
-        metadata = trafilatura.extract_metadata(downloaded)
-        title = metadata.title if metadata else None
 
-        # Extract main content
-        content = trafilatura.extract(downloaded)
+def extract_article_content(html: bytes, url: str, source_name: str) -> Optional[dict]:
+    """
+    Extract title and content from downloaded article HTML using trafilatura.
+    Runs in a worker process, so the document is parsed only once for both.
+    """
+    # Already loaded in pool workers (see extraction_pool); imported on first use otherwise
+    import trafilatura
+
+    try:
+        # The date is not stored: skip htmldate's free-text date search, which
+        # compiles dateparser's locale patterns on first use in every process
+        document = trafilatura.bare_extraction(
+            html, url=url, with_metadata=True,
+            date_extraction_params={"extensive_search": False, "original_date": True},
+        )
+        if document is not None and not isinstance(document, dict):
+            # trafilatura >= 2.0 returns a Document object
+            document = document.as_dict()
+
+        title = document.get("title") if document else None
+        content = document.get("text") if document else None
 
         if not title or not content:
             print(f"  Could not extract content from: {url}")
@@ -113,53 +705,205 @@ def extract_article_content(url: str, source_name: str) -> Optional[dict]:
         return None
 
 
-def save_article(article: dict) -> bool:
-    """Save an article to Supabase."""
+def save_article(article: dict) -> Optional[dict]:
+    """Save an article to Supabase; returns the saved row or None."""
     try:
-        supabase.table("article_websites").insert(article).execute()
+        response = get_supabase().table("article_websites").insert(article).execute()
         print(f"  Saved: {article['title'][:50]}...")
-        return True
+        metrics.count("scraper_articles_saved")
+        return response.data[0]
     except Exception as e:
         print(f"  Error saving article: {e}")
-        return False
+        metrics.count("scraper_articles_errored")
+        return None
 
 
-def main():
-    """Main scraper function."""
-    print("Starting Multi-Source News Scraper...")
-    print(f"Configured sources: {[s['name'] for s in SOURCES]}\n")
+def save_articles(articles: list) -> tuple:
+    """
+    Save a batch of articles in one upsert, skipping URLs that already exist.
+    Falls back to per-article inserts when the batch fails, so each bad row
+    is still reported on its own. Returns (saved rows, number of failures);
+    a failed batch counts as at least one failure.
+    """
+    if not articles:
+        return [], 0
 
-    # Get existing URLs to avoid duplicates
-    existing_urls = get_existing_urls()
-    print(f"Found {len(existing_urls)} existing articles in database\n")
+    try:
+        response = get_supabase().table("article_websites").upsert(
+            articles, on_conflict="url", ignore_duplicates=True
+        ).execute()
+    except Exception as e:
+        print(f"  Error saving batch of {len(articles)} articles, retrying one by one: {e}")
+        saved = [row for row in map(save_article, articles) if row]
+        return saved, max(1, len(articles) - len(saved))
 
-    total_saved = 0
+    for article in response.data:
+        print(f"  Saved: {article['title'][:50]}...")
+    skipped = len(articles) - len(response.data)
+    if skipped:
+        print(f"  Skipped {skipped} articles that were already saved")
+    metrics.count("scraper_articles_saved", len(response.data))
+    metrics.count("scraper_articles_skipped", skipped)
+    return response.data, 0
 
-    # Process each source
-    for source in SOURCES:
-        print(f"[{source['name'].upper()}] Scraping {source['url']}")
 
-        # Get article links from this source
-        article_links = get_article_links(source)
+def extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """The process pool for trafilatura extraction, or None to extract in the download threads."""
+    if EXTRACT_PROCESSES <= 1:
+        return None
+    # The fork server imports trafilatura once, when the first task starts a worker;
+    # every worker is forked with it loaded instead of importing it itself
+    return pipeline_workers.process_pool(EXTRACT_PROCESSES, __name__, __file__, preload=["trafilatura"])
+
+
+def scrape_sources(on_saved=None, extract_pool: Optional[ProcessPoolExecutor] = None) -> int:
+    """
+    Scrape all SOURCES and save new articles. `on_saved` is called with each
+    batch of saved rows. Returns the number of saved articles.
+    Pass `extract_pool` (from extraction_pool()) to use a pool created by the caller.
+    """
+    # URLs already queued in this run (prevents duplicates across sources)
+    seen_urls = set()
+    total_saved = 0
 
-        # Filter out already scraped URLs
-        new_links = [url for url in article_links if url not in existing_urls]
-        print(f"  {len(new_links)} new articles to scrape")
+    # Downloads run on threads, CPU-bound extraction on a process pool
+    own_pool = extract_pool is None
+    if own_pool:
+        extract_pool = extraction_pool()
+
+    with ThreadPoolExecutor(max_workers=max(MAX_WORKERS, len(SOURCES))) as executor:
+        pool = extract_pool or executor
+
+        # Discover the articles of all sources in parallel
+        for source in SOURCES:
+            discovery = source.get("discovery", "html")
+            location = source.get({"feed": "feed_url", "sitemap": "sitemap_url"}.get(discovery, "url"))
+            print(f"[{source['name'].upper()}] Scraping {location} ({discovery})")
+        link_futures = {executor.submit(discover_articles, source): source for source in SOURCES}
+
+        # Queue every new article; downloads wait per host for the host's rate limit
+        jobs = {}
+        queued = {}
+        pending_per_source = {}
+        failed_per_source = {}
+        checkpoints = {}
+        for future in as_completed(link_futures):
+            source = link_futures[future]
+            items, checkpoint = future.result()
+
+            # Filter out already scraped URLs (also across sources)
+            items = {item["url"]: item for item in items if item["url"] not in seen_urls}
+            candidates = list(items)
+            try:
+                existing_urls = get_existing_urls(candidates)
+            except Exception as e:
+                # No checkpoint is stored, so the next run reads the source again
+                print(f"  [{source['name'].upper()}] Error checking for saved articles, skipping source: {e}")
+                metrics.count("scraper_index_errors")
+                continue
+            new_links = [url for url in candidates if url not in existing_urls]
+            unextractable = get_unextractable_urls(new_links)
+            new_links = [url for url in new_links if url not in unextractable]
+            seen_urls.update(candidates)
+            metrics.count("scraper_articles_skipped", len(candidates) - len(new_links))
+            print(f"  [{source['name'].upper()}] {len(new_links)} new articles to scrape")
+
+            pending_per_source[source["name"]] = len(new_links)
+            failed_per_source[source["name"]] = 0
+            checkpoints[source["name"]] = checkpoint
+            if not new_links:
+                store_checkpoint(source["name"], checkpoint)
+
+            for url in new_links:
+                item = items[url]
+                if len(item["content"] or "") >= FEED_FULLTEXT_MIN_CHARS:
+                    # The feed has the full text: extract it without downloading the article
+                    metrics.count("scraper_feed_fulltext")
+                    job = pool.submit(metrics.measure, extract_article_content, feed_item_html(item), url, source["name"])
+                    jobs[job] = ("extract", url, source["name"])
+                else:
+                    queued.setdefault(urlparse(url).netloc, deque()).append((url, source["name"]))
+
+        # Hand finished downloads to the extraction stage while other downloads
+        # keep running. Extracted articles are buffered and flushed in batches:
+        # when the buffer is full and when a source has no articles left.
+        buffers = {name: [] for name in pending_per_source}
+        pending = set(jobs)
+        downloading = 0
+        while pending or any(queued.values()):
+            # Submit a download only once its host has a token and a thread is free,
+            # so no thread sleeps on one host's rate limit while other hosts wait
+            next_token = None
+            for host, queue in queued.items():
+                while queue and downloading < MAX_WORKERS:
+                    wait_seconds = get_host_bucket(host).try_acquire()
+                    if wait_seconds:
+                        next_token = wait_seconds if next_token is None else min(next_token, wait_seconds)
+                        break
+                    url, source_name = queue.popleft()
+                    future = executor.submit(download_article, url, True)
+                    jobs[future] = ("download", url, source_name)
+                    pending.add(future)
+                    downloading += 1
+
+            done, pending = wait(pending, timeout=next_token, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, url, source_name = jobs.pop(future)
+                if stage == "download":
+                    downloading -= 1
+
+                if stage == "download" and future.result():
+                    # Timed inside the worker; metrics recorded in a worker process would be lost
+                    extract_future = pool.submit(metrics.measure, extract_article_content, future.result(), url, source_name)
+                    jobs[extract_future] = ("extract", url, source_name)
+                    pending.add(extract_future)
+                    continue
+
+                pending_per_source[source_name] -= 1
+                if stage == "download":
+                    # Failed download: retried on the next run
+                    failed_per_source[source_name] += 1
+                else:
+                    article, seconds = future.result()
+                    metrics.observe("extract_article_content", seconds, ok=article is not None)
+                    if article:
+                        buffers[source_name].append(article)
+                    else:
+                        # No article on the page (video, liveblog): retrying will not help,
+                        # so remember it instead of holding back the checkpoint
+                        metrics.count("scraper_articles_errored")
+                        store_unextractable_url(url)
+
+                buffer = buffers[source_name]
+                if len(buffer) >= INSERT_BATCH_SIZE or (buffer and pending_per_source[source_name] == 0):
+                    saved, failed = save_articles(buffer)
+                    failed_per_source[source_name] += failed
+                    total_saved += len(saved)
+                    buffers[source_name] = []
+                    if saved and on_saved:
+                        on_saved(saved)
+
+                # Store the validators and watermark only when every new article of the
+                # source was saved (or cannot be extracted), so the next run reads the
+                # page again and retries the failed downloads and saves
+                if pending_per_source[source_name] == 0 and not failed_per_source[source_name]:
+                    store_checkpoint(source_name, checkpoints[source_name])
+
+    if own_pool and extract_pool:
+        extract_pool.shutdown()
+
+    return total_saved
 
-        # Process each new article
-        for url in new_links:
-            article = extract_article_content(url, source["name"])
-            if article:
-                if save_article(article):
-                    total_saved += 1
-                    existing_urls.add(url)  # Prevent duplicates across sources
 
-            # Rate limiting: wait 2 seconds between requests
-            time.sleep(2)
+def main():
+    """Main scraper function."""
+    metrics.init("scraper")
+    print("Starting Multi-Source News Scraper...")
+    print(f"Configured sources: {[s['name'] for s in SOURCES]}\n")
 
-        print()
+    total_saved = scrape_sources()
 
-    print(f"Scraping complete. Saved {total_saved} new articles total.")
+    print(f"\nScraping complete. Saved {total_saved} new articles total.")
 
 
 if __name__ == "__main__":
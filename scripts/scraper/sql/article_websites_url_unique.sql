@@ -0,0 +1,12 @@
+-- Unique URL constraint for article_websites.
+-- Required by the scraper's batched upsert (on_conflict="url"), and makes
+-- overlapping scraper runs unable to insert the same article twice.
+
+-- Remove existing duplicates first, keeping the oldest row per URL
+DELETE FROM article_websites a
+USING article_websites b
+WHERE a.url = b.url
+  AND a.id > b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS article_websites_url_key
+  ON article_websites (url);
@@ -4,22 +4,62 @@ AI Article Processor
 Transforms raw articles from article_websites into polished articles using AI.
 """
 
+import hashlib
+import io
 import os
 import json
-from openai import OpenAI
-from supabase import create_client, Client
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
+# Shared instrumentation and clients (scripts/pipeline_metrics.py, scripts/pipeline_clients.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import pipeline_metrics as metrics  # noqa: E402
+from pipeline_clients import RateLimiter, get_openai_client, get_supabase, has_rows  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Batch mode: number of articles per batch, concurrent AI calls and total time budget (seconds)
+BATCH_SIZE = int(os.getenv("PROCESSOR_BATCH_SIZE", "10"))
+MAX_CONCURRENCY = int(os.getenv("PROCESSOR_CONCURRENCY", "4"))
+TIME_BUDGET_SECONDS = float(os.getenv("PROCESSOR_TIME_BUDGET", "600"))
+MAX_RATE_LIMIT_RETRIES = int(os.getenv("PROCESSOR_RATE_LIMIT_RETRIES", "5"))
+
+# Work claiming: each worker leases the rows it processes; expired leases are reclaimed
+WORKER_ID = os.getenv("PROCESSOR_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+LEASE_SECONDS = int(os.getenv("PROCESSOR_LEASE_SECONDS", "900"))
+
+# "realtime" rewrites articles directly; "batch" uses the OpenAI Batch API
+# (half the cost, results are ingested on a later run)
+PROCESSOR_MODE = os.getenv("PROCESSOR_MODE", "realtime")
+BATCH_API_MAX_ARTICLES = int(os.getenv("PROCESSOR_BATCH_API_MAX_ARTICLES", "500"))
+
+AI_MODEL = "gpt-4o-mini"
+
+# Input budget for the source text; longer articles are trimmed at a paragraph boundary
+MAX_INPUT_TOKENS = int(os.getenv("PROCESSOR_MAX_INPUT_TOKENS", "6000"))
 
-# Initialize clients
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# Local SQLite cache of AI rewrites, plus SimHash fingerprints for near-duplicate detection
+SCRIPT_DIR = Path(__file__).parent
+CACHE_DB_PATH = Path(os.getenv("PROCESSOR_CACHE_DB", str(SCRIPT_DIR / "processor_cache.sqlite3")))
+CACHE_MAX_AGE_DAYS = float(os.getenv("PROCESSOR_CACHE_MAX_AGE_DAYS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("PROCESSOR_CACHE_MAX_ENTRIES", "5000"))
+# Max number of differing SimHash bits (out of 64) to still count as the same story
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("PROCESSOR_NEAR_DUPLICATE_DISTANCE", "3"))
+
+# Stream completions and validate fields as they arrive; invalid output is retried
+STREAMING = os.getenv("PROCESSOR_STREAMING", "1") == "1"
+MAX_VALIDATION_RETRIES = int(os.getenv("PROCESSOR_VALIDATION_RETRIES", "2"))
 
 # Author ID for all processed articles
 AUTHOR_ID = "54e42e2d-3b18-4bb6-a962-f298aecb8c75"
@@ -88,35 +128,433 @@ BESCHIKBARE TOPICS:
 
 ANTWOORD ALLEEN MET VALIDE JSON, GEEN ANDERE TEKST."""
 
+REQUIRED_FIELDS = (
+    "title", "summary", "body", "read_time_minutes", "seo_title",
+    "seo_description", "slug", "structured_data", "primary_topic_id",
+)
+SLUG_PATTERN = re.compile(r"^[a-z0-9]+(?:-[a-z0-9]+){1,7}$")
+MAX_LENGTHS = {"title": 80, "seo_title": 60, "seo_description": 160}
+
+# Changes whenever the prompt changes, so cached rewrites of an old prompt are not reused
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+def has_pending_work() -> bool:
+    """Whether there are 'new' articles, expired leases or (in batch mode) open batches."""
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    conditions = ["status.eq.new", f'and(status.eq.processing,lease_expires_at.lt."{now}")']
+    if PROCESSOR_MODE == "batch":
+        conditions.append("status.eq.batched")
+    return has_rows("article_websites", {"or": f"({','.join(conditions)})"})
+
+
+def claim_articles(ids: list) -> list:
+    """Claim specific 'new' articles for this worker; returns the rows that were claimed."""
+    if not ids:
+        return []
+    lease_expires_at = datetime.now(timezone.utc) + timedelta(seconds=LEASE_SECONDS)
+    response = get_supabase().table("article_websites").update({
+        "status": "processing",
+        "claimed_by": WORKER_ID,
+        "lease_expires_at": lease_expires_at.isoformat(),
+    }).in_("id", ids).eq("status", "new").execute()
+    return response.data or []
+
+
+def claim_pending_articles(limit: int) -> list:
+    """
+    Atomically claim up to `limit` articles for this worker (status 'new' → 'processing').
+    Rows whose lease has expired are claimed again. See sql/claim_article_websites.sql.
+    """
+    response = get_supabase().rpc("claim_article_websites", {
+        "p_worker_id": WORKER_ID,
+        "p_limit": limit,
+        "p_lease_seconds": LEASE_SECONDS,
+    }).execute()
+    return response.data or []
+
+
+# Shared pause after a 429, so every worker waits instead of hammering the API
+call_with_rate_limit = RateLimiter(MAX_RATE_LIMIT_RETRIES).call
+
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or estimate (~4 characters per token) if it isn't available."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except ImportError:
+            _encoding = False
+        except Exception as e:
+            # tiktoken downloads the encoding on first use; without network, estimate instead
+            print(f"  Could not load tiktoken encoding, estimating token counts: {e}")
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def trim_to_token_budget(text: str, max_tokens: int) -> str:
+    """Keep the leading paragraphs of a text that fit within max_tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for paragraph in text.split("\n"):
+        tokens = count_tokens(paragraph) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.append(paragraph)
+        used += tokens
+
+    if not kept:
+        # A single huge paragraph: fall back to a character cut
+        return text[:max_tokens * 4]
+    return "\n".join(kept)
+
+
+# Token usage of this run (input, cached input and output tokens)
+_usage_lock = threading.Lock()
+token_usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+
+def record_usage(usage) -> None:
+    """Add the token usage of one completion (object or dict) to token_usage and log it."""
+    if not usage:
+        return
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+    with _usage_lock:
+        token_usage["requests"] += 1
+        token_usage["prompt_tokens"] += prompt_tokens
+        token_usage["cached_tokens"] += cached_tokens
+        token_usage["completion_tokens"] += completion_tokens
+    metrics.count("processor_prompt_tokens", prompt_tokens)
+    metrics.count("processor_cached_prompt_tokens", cached_tokens)
+    metrics.count("processor_completion_tokens", completion_tokens)
+
+    print(f"  Tokens: {prompt_tokens} in ({cached_tokens} cached), {completion_tokens} out")
+
+
+def build_chat_request(content: str, title: str) -> dict:
+    """
+    Build the chat completion request for one article (also used for the Batch API).
+    The static SYSTEM_PROMPT comes first so OpenAI's prompt caching can reuse it;
+    only the user message differs per article.
+    """
+    trimmed = trim_to_token_budget(content, MAX_INPUT_TOKENS)
+    if trimmed is not content:
+        print(f"  Trimmed source text from {count_tokens(content)} to {count_tokens(trimmed)} tokens")
+        content = trimmed
 
-def get_pending_article():
-    """Fetch one article with status 'new' from article_websites."""
-    response = supabase.table("article_websites").select("*").eq("status", "new").limit(1).execute()
-
-    if response.data and len(response.data) > 0:
-        return response.data[0]
-    return None
-
-
-def process_with_ai(content: str, title: str) -> dict:
-    """Send content to OpenAI and get structured article data."""
     user_message = f"ORIGINELE TITEL: {title}\n\nORIGINELE TEKST:\n{content}"
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    return {
+        "model": AI_MODEL,
+        "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_message}
         ],
-        response_format={"type": "json_object"},
-        temperature=0.7
-    )
+        "response_format": {"type": "json_object"},
+        "temperature": 0.7,
+    }
+
 
-    return json.loads(response.choices[0].message.content)
+_cache_db = None
+_cache_db_lock = threading.Lock()
+
+
+def get_cache_db() -> sqlite3.Connection:
+    """Open (and create if needed) the local cache database; call with _cache_db_lock held."""
+    global _cache_db
+    if _cache_db is None:
+        _cache_db = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+        _cache_db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS ai_responses (
+                cache_key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS content_fingerprints (
+                article_id INTEGER PRIMARY KEY,
+                simhash INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """
+        )
+        evict_cache(_cache_db)
+    return _cache_db
+
+
+def evict_cache(db: sqlite3.Connection) -> None:
+    """Drop entries older than CACHE_MAX_AGE_DAYS and keep at most CACHE_MAX_ENTRIES per table."""
+    cutoff = time.time() - CACHE_MAX_AGE_DAYS * 86400
+    for table in ("ai_responses", "content_fingerprints"):
+        db.execute(f"DELETE FROM {table} WHERE created_at < ?", (cutoff,))
+        db.execute(
+            f"DELETE FROM {table} WHERE rowid NOT IN "
+            f"(SELECT rowid FROM {table} ORDER BY created_at DESC LIMIT ?)",
+            (CACHE_MAX_ENTRIES,),
+        )
+    db.commit()
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace, so trivial formatting changes hash the same."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def response_cache_key(content: str, title: str) -> str:
+    """Cache key for an AI rewrite: normalized title + content, prompt version and model."""
+    parts = [normalize_text(title), normalize_text(content), PROMPT_VERSION, AI_MODEL, str(MAX_INPUT_TOKENS)]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def get_cached_response(cache_key: str):
+    """Return the cached AI response for a key, or None."""
+    with _cache_db_lock:
+        row = get_cache_db().execute(
+            "SELECT response FROM ai_responses WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def store_cached_response(cache_key: str, ai_data: dict) -> None:
+    """Store an AI response in the local cache."""
+    with _cache_db_lock:
+        db = get_cache_db()
+        db.execute(
+            "INSERT OR REPLACE INTO ai_responses VALUES (?, ?, ?)",
+            (cache_key, json.dumps(ai_data, ensure_ascii=False), time.time()),
+        )
+        db.commit()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles of the normalized text."""
+    words = normalize_text(text).split()
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))]
+
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = sum(1 << bit for bit in range(64) if weights[bit] > 0)
+    # SQLite integers are signed 64-bit
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def find_near_duplicate(article_id: int, fingerprint: int):
+    """Return the id of an earlier processed article with (almost) the same content, if any."""
+    with _cache_db_lock:
+        rows = get_cache_db().execute(
+            "SELECT article_id, simhash FROM content_fingerprints WHERE article_id != ?",
+            (article_id,),
+        ).fetchall()
+
+    for other_id, other_fingerprint in rows:
+        if ((fingerprint ^ other_fingerprint) & ((1 << 64) - 1)).bit_count() <= NEAR_DUPLICATE_MAX_DISTANCE:
+            return other_id
+    return None
 
 
-def save_processed_article(ai_data: dict) -> bool:
-    """Save the processed article to the articles table."""
+def store_fingerprint(article_id: int, fingerprint: int) -> None:
+    """Remember the SimHash of a processed article."""
+    with _cache_db_lock:
+        db = get_cache_db()
+        db.execute(
+            "INSERT OR REPLACE INTO content_fingerprints VALUES (?, ?, ?)",
+            (article_id, fingerprint, time.time()),
+        )
+        db.commit()
+
+
+class InvalidFieldError(ValueError):
+    """Raised when the AI output has a missing or invalid field."""
+
+    def __init__(self, field: str, message: str):
+        super().__init__(f"{field}: {message}")
+        self.field = field
+        self.message = message
+
+
+def validate_field(field: str, value) -> None:
+    """Raise InvalidFieldError if a single AI output field is invalid."""
+    if field in ("title", "summary", "body", "seo_title", "seo_description", "slug", "primary_topic_id"):
+        if not isinstance(value, str) or not value.strip():
+            raise InvalidFieldError(field, "moet een niet-lege string zijn")
+    if field in MAX_LENGTHS and len(value) > MAX_LENGTHS[field]:
+        raise InvalidFieldError(field, f"is {len(value)} karakters, maximaal {MAX_LENGTHS[field]}")
+    if field == "slug" and not SLUG_PATTERN.match(value):
+        raise InvalidFieldError(field, "moet lowercase woorden met koppeltekens zijn")
+    if field == "primary_topic_id" and value not in TOPICS:
+        raise InvalidFieldError(field, "moet een ID uit de lijst met topics zijn")
+    if field == "read_time_minutes" and (not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= 60):
+        raise InvalidFieldError(field, "moet een geheel aantal minuten zijn")
+    if field == "structured_data" and not isinstance(value, dict):
+        raise InvalidFieldError(field, "moet een JSON object zijn")
+
+
+def validate_ai_data(ai_data: dict) -> dict:
+    """Validate a complete AI response; raises InvalidFieldError."""
+    for field in REQUIRED_FIELDS:
+        if field not in ai_data:
+            raise InvalidFieldError(field, "ontbreekt")
+        validate_field(field, ai_data[field])
+    return ai_data
+
+
+class StreamingFieldParser:
+    """
+    Incrementally parses a streamed top-level JSON object and returns each
+    member as soon as its value is complete.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, chars: str) -> None:
+        while self.pos < len(self.buffer) and self.buffer[self.pos] in chars:
+            self.pos += 1
+
+    def _decode(self, start: int):
+        """Decode the JSON value at start; only accept it once a character follows it."""
+        value, end = self._decoder.raw_decode(self.buffer, start)
+        if end >= len(self.buffer):
+            raise json.JSONDecodeError("value may be incomplete", self.buffer, end)
+        return value, end
+
+    def feed(self, chunk: str) -> list:
+        """Add a chunk of text and return the (field, value) pairs completed by it."""
+        self.buffer += chunk
+        completed = []
+
+        while True:
+            start = self.pos
+            self._skip(" \t\r\n,{")
+            if self.pos >= len(self.buffer) or self.buffer[self.pos] == "}":
+                return completed
+
+            try:
+                key, end = self._decode(self.pos)
+                self.pos = end
+                self._skip(" \t\r\n:")
+                value, end = self._decode(self.pos)
+            except json.JSONDecodeError:
+                # Wait for more data and retry this member from the start
+                self.pos = start
+                return completed
+
+            self.pos = end
+            completed.append((key, value))
+
+
+# Time until the first validated field arrived, per streamed request
+_latency_lock = threading.Lock()
+first_field_latencies = []
+
+
+def record_first_field_latency(seconds: float) -> None:
+    """Record and log the time-to-first-validated-field of a streamed request."""
+    with _latency_lock:
+        first_field_latencies.append(seconds)
+    metrics.observe("first_valid_field", seconds)
+    print(f"  First valid field after {seconds:.2f}s")
+
+
+def stream_completion(request: dict) -> dict:
+    """
+    Stream a chat completion, validating each field as soon as it is complete.
+    Closes the stream and raises InvalidFieldError on the first invalid field.
+    """
+    started = time.monotonic()
+    first_valid_at = None
+    parser = StreamingFieldParser()
+    content = []
+
+    stream = call_with_rate_limit(
+        get_openai_client().chat.completions.create,
+        stream=True,
+        stream_options={"include_usage": True},
+        **request
+    )
+    try:
+        for chunk in stream:
+            if chunk.usage:
+                record_usage(chunk.usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+
+            text = chunk.choices[0].delta.content
+            content.append(text)
+            for field, value in parser.feed(text):
+                validate_field(field, value)
+                if first_valid_at is None:
+                    first_valid_at = time.monotonic() - started
+                    record_first_field_latency(first_valid_at)
+    finally:
+        stream.close()
+
+    return validate_ai_data(json.loads("".join(content)))
+
+
+@metrics.timed()
+def process_with_ai(content: str, title: str) -> dict:
+    """Send content to OpenAI and get structured, validated article data (served from cache when possible)."""
+    cache_key = response_cache_key(content, title)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        print("  Using cached AI response")
+        metrics.count("processor_ai_cache_hits")
+        return cached
+
+    request = build_chat_request(content, title)
+    for attempt in range(MAX_VALIDATION_RETRIES + 1):
+        try:
+            if STREAMING:
+                ai_data = stream_completion(request)
+            else:
+                response = call_with_rate_limit(get_openai_client().chat.completions.create, **request)
+                record_usage(response.usage)
+                ai_data = validate_ai_data(json.loads(response.choices[0].message.content))
+            break
+        except (InvalidFieldError, json.JSONDecodeError) as e:
+            if attempt == MAX_VALIDATION_RETRIES:
+                raise
+            print(f"  Invalid AI output ({e}), retrying")
+            metrics.count("processor_ai_validation_retries")
+
+            # Keep the cacheable prefix and add a targeted correction at the end
+            field = e.field if isinstance(e, InvalidFieldError) else "JSON"
+            request = build_chat_request(content, title)
+            request["messages"].append({
+                "role": "user",
+                "content": f"Je vorige antwoord was ongeldig ({field}: {getattr(e, 'message', e)}). "
+                           f"Genereer het volledige JSON-antwoord opnieuw en houd je aan de regels.",
+            })
+
+    store_cached_response(cache_key, ai_data)
+    return ai_data
+
+
+def save_processed_article(ai_data: dict) -> Optional[dict]:
+    """Save the processed article to the articles table; returns the saved row or None."""
     # Build the article record
     article = {
         "title": ai_data.get("title", ""),
@@ -134,56 +572,247 @@ def save_processed_article(ai_data: dict) -> bool:
     }
 
     try:
-        supabase.table("articles").insert(article).execute()
+        response = get_supabase().table("articles").insert(article).execute()
         print(f"  Saved article: {article['title'][:50]}...")
-        return True
+        return response.data[0] if response.data else article
     except Exception as e:
         print(f"  Error saving article: {e}")
-        return False
+        return None
 
 
-def update_source_status(article_id: int, status: str) -> bool:
-    """Update the status of the source article in article_websites."""
+def update_source_status(article_id: int, status: str, owner: str = WORKER_ID) -> bool:
+    """Update the status of a source article claimed by `owner` and release its lease."""
     try:
-        supabase.table("article_websites").update({"status": status}).eq("id", article_id).execute()
+        get_supabase().table("article_websites").update({
+            "status": status,
+            "claimed_by": None,
+            "lease_expires_at": None,
+        }).eq("id", article_id).eq("claimed_by", owner).execute()
         return True
     except Exception as e:
         print(f"  Error updating status: {e}")
         return False
 
 
-def main():
-    """Main processor function."""
-    print("Starting AI Article Processor...")
-
-    # Get one pending article
-    article = get_pending_article()
-
-    if not article:
-        print("No articles with status 'new' found.")
-        return
-
+def process_article(article: dict) -> Optional[dict]:
+    """
+    Rewrite one source article with AI and store the result.
+    Returns the saved articles row, or None if it was skipped or failed.
+    """
+    label = article['title'][:40]
     print(f"\nProcessing: {article['title'][:60]}...")
     print(f"  Source: {article['source']}")
 
     try:
+        # Skip stories we already rewrote from another source or URL
+        fingerprint = simhash(article['content'])
+        duplicate_of = find_near_duplicate(article['id'], fingerprint)
+        if duplicate_of is not None:
+            print(f"  [{label}] Near-duplicate of article {duplicate_of}, skipping")
+            update_source_status(article['id'], 'duplicate')
+            metrics.count("processor_articles_skipped")
+            return None
+
         # Process with AI
-        print("  Sending to AI...")
+        print(f"  [{label}] Sending to AI...")
         ai_data = process_with_ai(article['content'], article['title'])
 
         # Save to articles table
-        print("  Saving processed article...")
-        if save_processed_article(ai_data):
+        print(f"  [{label}] Saving processed article...")
+        saved = save_processed_article(ai_data)
+        if saved:
             # Update source status
+            store_fingerprint(article['id'], fingerprint)
             update_source_status(article['id'], 'processed')
-            print("  Status updated to 'processed'")
-            print("\nProcessing complete!")
-        else:
-            print("  Failed to save article")
+            print(f"  [{label}] Status updated to 'processed'")
+            metrics.count("processor_articles_saved")
+            return saved
+
+        print(f"  [{label}] Failed to save article")
+        metrics.count("processor_articles_errored")
+        return None
 
     except Exception as e:
-        print(f"  Error during processing: {e}")
+        print(f"  [{label}] Error during processing: {e}")
         update_source_status(article['id'], 'error')
+        metrics.count("processor_articles_errored")
+        return None
+
+
+def submit_batch() -> bool:
+    """
+    Claim pending articles and submit them as one OpenAI Batch API job.
+    The rows move to status 'batched' with the batch id in claimed_by.
+    """
+    articles = claim_pending_articles(BATCH_API_MAX_ARTICLES)
+    if not articles:
+        return False
+
+    lines = []
+    for article in articles:
+        lines.append(json.dumps({
+            "custom_id": str(article['id']),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_chat_request(article['content'], article['title']),
+        }, ensure_ascii=False))
+
+    batch_file = io.BytesIO("\n".join(lines).encode("utf-8"))
+    batch_file.name = "article_websites.jsonl"
+    uploaded = get_openai_client().files.create(file=batch_file, purpose="batch")
+    batch = get_openai_client().batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+
+    ids = [article['id'] for article in articles]
+    get_supabase().table("article_websites").update({
+        "status": "batched",
+        "claimed_by": batch.id,
+        "lease_expires_at": None,
+    }).in_("id", ids).eq("claimed_by", WORKER_ID).execute()
+
+    print(f"  Submitted batch {batch.id} with {len(ids)} articles")
+    metrics.count("processor_batch_articles_submitted", len(ids))
+    return True
+
+
+def ingest_batch_output(batch_id: str, file_id: str) -> tuple:
+    """
+    Save the results of a finished batch. Returns (processed, failed) counts.
+    Only rows that are still 'batched' for this batch are ingested, so a run that
+    stopped halfway through a file does not save its first articles twice.
+    """
+    processed = 0
+    failed = 0
+
+    response = get_supabase().table("article_websites").select("id").eq("status", "batched").eq("claimed_by", batch_id).execute()
+    open_ids = {row["id"] for row in response.data or []}
+
+    for line in get_openai_client().files.content(file_id).text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        article_id = int(result["custom_id"])
+        if article_id not in open_ids:
+            continue
+        response = result.get("response") or {}
+
+        try:
+            if response.get("status_code") != 200:
+                raise ValueError(result.get("error") or f"status {response.get('status_code')}")
+            record_usage(response["body"].get("usage"))
+            ai_data = validate_ai_data(json.loads(response["body"]["choices"][0]["message"]["content"]))
+            ok = save_processed_article(ai_data)
+        except Exception as e:
+            print(f"  Error in batch result for article {article_id}: {e}")
+            update_source_status(article_id, 'error', owner=batch_id)
+            failed += 1
+            continue
+
+        if ok:
+            update_source_status(article_id, 'processed', owner=batch_id)
+            processed += 1
+        else:
+            failed += 1
+
+    metrics.count("processor_articles_saved", processed)
+    metrics.count("processor_articles_errored", failed)
+    return processed, failed
+
+
+def poll_batches() -> tuple:
+    """
+    Check every batch that still has 'batched' rows and ingest the finished ones.
+    Rows of failed, expired or cancelled batches without a result go back to 'new'.
+    Returns (processed, failed) counts.
+    """
+    response = get_supabase().table("article_websites").select("claimed_by").eq("status", "batched").execute()
+    batch_ids = {row["claimed_by"] for row in response.data or [] if row["claimed_by"]}
+
+    processed = 0
+    failed = 0
+    for batch_id in sorted(batch_ids):
+        batch = get_openai_client().batches.retrieve(batch_id)
+        print(f"  Batch {batch_id}: {batch.status}")
+
+        if batch.status not in ("completed", "failed", "expired", "cancelled"):
+            continue
+
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                counts = ingest_batch_output(batch_id, file_id)
+                processed += counts[0]
+                failed += counts[1]
+
+        # Anything without a result is requeued for the next run
+        get_supabase().table("article_websites").update({
+            "status": "new",
+            "claimed_by": None,
+        }).eq("status", "batched").eq("claimed_by", batch_id).execute()
+
+    return processed, failed
+
+
+def main_batch_api():
+    """Batch API mode: ingest finished batches, then submit the current backlog."""
+    print("Starting AI Article Processor (Batch API mode)...")
+
+    processed, failed = poll_batches()
+    if processed or failed:
+        print(f"  Ingested batch results: {processed} processed, {failed} failed.")
+
+    if not submit_batch():
+        print("No articles with status 'new' found.")
+
+
+def main():
+    """Main processor function."""
+    metrics.init("processor")
+    if not has_pending_work():
+        print("No articles with status 'new' found.")
+        return
+
+    if PROCESSOR_MODE == "batch":
+        main_batch_api()
+        return
+
+    print("Starting AI Article Processor...")
+    print(f"Worker: {WORKER_ID}")
+    print(f"Batch size: {BATCH_SIZE}, concurrency: {MAX_CONCURRENCY}, time budget: {TIME_BUDGET_SECONDS:.0f}s")
+
+    deadline = time.monotonic() + TIME_BUDGET_SECONDS
+    processed = 0
+    skipped = 0
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as executor:
+        # Keep claiming batches until the backlog or the time budget runs out
+        while time.monotonic() < deadline:
+            # Rows that fail to save keep their lease and are retried once it expires
+            articles = claim_pending_articles(BATCH_SIZE)
+            if not articles:
+                break
+
+            for saved in executor.map(process_article, articles):
+                if saved:
+                    processed += 1
+                else:
+                    skipped += 1
+
+    if processed == 0 and skipped == 0:
+        print("No articles with status 'new' found.")
+        return
+
+    print(f"\nProcessing complete! {processed} processed, {skipped} skipped or failed.")
+    print(
+        f"Token usage: {token_usage['prompt_tokens']} in "
+        f"({token_usage['cached_tokens']} cached), {token_usage['completion_tokens']} out "
+        f"over {token_usage['requests']} requests"
+    )
+    if first_field_latencies:
+        average = sum(first_field_latencies) / len(first_field_latencies)
+        print(f"Time to first validated field: {average:.2f}s average")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,39 @@
+-- Work-claiming queue for article_websites.
+-- Lets several processor workers run side by side: each row is leased by
+-- exactly one worker, and rows whose lease has expired (crashed worker)
+-- are handed out again.
+
+ALTER TABLE article_websites
+  ADD COLUMN IF NOT EXISTS claimed_by text,
+  ADD COLUMN IF NOT EXISTS lease_expires_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS article_websites_status_id_idx
+  ON article_websites (status, id);
+
+CREATE OR REPLACE FUNCTION claim_article_websites(
+  p_worker_id text,
+  p_limit integer,
+  p_lease_seconds integer
+)
+RETURNS SETOF article_websites
+LANGUAGE sql
+AS $$
+  UPDATE article_websites AS a
+  SET status = 'processing',
+      claimed_by = p_worker_id,
+      lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+  WHERE a.id IN (
+    SELECT id
+    FROM article_websites
+    WHERE status = 'new'
+       OR (status = 'processing' AND lease_expires_at < now())
+    ORDER BY id
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING a.*;
+$$;
+
+-- Only the service role (used by the processor) may claim work
+REVOKE EXECUTE ON FUNCTION claim_article_websites(text, integer, integer) FROM public, anon, authenticated;
+GRANT EXECUTE ON FUNCTION claim_article_websites(text, integer, integer) TO service_role;